@@ -0,0 +1,77 @@
+# 倒立振子の制御則（Python版）
+# inverted_pendulum/03_inverted_pendulum/03_inverted_pendulum.ino の loop() と同じ計算
+# 相補フィルタで角度を求め、PID の出力を左右のモーター（-255〜255）に振り分ける
+
+import math
+
+ALPHA = 0.98
+SAFETY_ANGLE = 45.0
+RC_ANGLE_MAX = 3.0    # 前後操作で傾ける最大角度
+RC_TURN_SPEED = 80.0  # 旋回時の左右モーター速度差
+GYRO_SCALE = 131.0    # ±250°/s のときの LSB/(°/s)
+
+
+def constrain(value, low, high):
+    return low if value < low else high if value > high else value
+
+
+class BalanceController:
+    """update() を呼ぶたびに1周期分の計算をする
+
+    結果は属性（motor_a, motor_b, error, output）に入れるので、
+    呼び出しごとに新しいオブジェクトを作らない。
+    """
+
+    def __init__(self, kp=42.0, ki=2.1, kd=2.5, target_angle=0.0):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.base_target_angle = target_angle
+        self.rc_forward = 0.0  # 前後 -1.0 ~ 1.0 (前進が正)
+        self.rc_turn = 0.0     # 旋回 -1.0 ~ 1.0 (右が正)
+
+        self.angle = 0.0
+        self.prev_angle = 0.0
+        self.integral = 0.0
+        self.error = 0.0
+        self.output = 0
+        self.motor_a = 0
+        self.motor_b = 0
+
+    def update(self, ay, az, gx, dt):
+        """センサー値（生の値）から次のモーター出力を求める
+
+        安全角度を超えたら False を返す（モーターは止めること）。
+        """
+        target = self.base_target_angle + self.rc_forward * RC_ANGLE_MAX
+
+        # 角度取得（相補フィルタ）
+        accel_angle = math.atan2(ay, az) * 180.0 / math.pi
+        gyro_rate = gx / GYRO_SCALE
+        self.angle = ALPHA * (self.angle + gyro_rate * dt) + (1.0 - ALPHA) * accel_angle
+
+        # 安全チェック
+        if abs(self.angle - target) > SAFETY_ANGLE:
+            self.motor_a = self.motor_b = 0
+            return False
+
+        # PID制御
+        error = self.angle - target
+        self.integral = constrain(self.integral + error * dt, -100, 100)
+        derivative = (self.angle - self.prev_angle) / dt
+        self.prev_angle = self.angle
+
+        output = self.kp * error + self.ki * self.integral + self.kd * derivative
+        motor_pwm = constrain(int(output), -255, 255)
+
+        # 旋回を加える
+        turn_offset = int(self.rc_turn * RC_TURN_SPEED)
+        self.motor_a = constrain(-motor_pwm - turn_offset, -255, 255)
+        self.motor_b = constrain(motor_pwm - turn_offset, -255, 255)
+        self.error = error
+        self.output = motor_pwm
+        return True
+
+    def reset(self):
+        """PIDパラメータを変えたときと同じく積分をリセットする"""
+        self.integral = 0.0
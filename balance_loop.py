@@ -0,0 +1,265 @@
+# Raspberry Pi で倒立振子の制御ループを動かす
+# 03_inverted_pendulum.ino と同じ制御則（balance.py）を、決まった周期で正確に回す
+#
+# time.sleep(0.01) を繰り返すだけだと、処理時間や寝坊が積み重なって周期がずれていく。
+# ここでは「次の締め切り時刻」まで clock_nanosleep(TIMER_ABSTIME) で眠り、
+# 遅れても次の周期の時刻は変えない（遅れが積み重ならない）。
+# 起床の遅れ（ジッタ）と処理時間はヒストグラムに記録する。
+#
+# 使い方:
+#   python3 balance_loop.py --sim                   # 物理シミュレーションで動かす
+#   sudo python3 balance_loop.py --sim --fifo 50 --cpu 3   # SCHED_FIFO・CPU固定
+#   sudo python3 balance_loop.py                    # 実機（MPU6050 + motor_control.py のピン）
+
+import argparse
+import ctypes
+import ctypes.util
+import gc
+import math
+import os
+import time
+from array import array
+
+from balance import BalanceController
+
+CLOCK_MONOTONIC = 1
+TIMER_ABSTIME = 1
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+HIST_BIN_US = 10     # ヒストグラムの1区間（マイクロ秒）
+HIST_BINS = 1000     # 10ms まで。それ以上は最後の区間に入れる
+
+
+class Timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+def _load_libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.clock_nanosleep  # noqa: B018 (Linux 以外では AttributeError)
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+_libc = _load_libc()
+
+
+class Histogram:
+    """マイクロ秒単位の固定区間ヒストグラム（ループ中にメモリを確保しない）"""
+
+    def __init__(self):
+        self.counts = array('q', bytes(8 * HIST_BINS))
+        self.max_ns = 0
+        self.total = 0
+
+    def add(self, ns):
+        i = ns // (HIST_BIN_US * 1000)
+        if i >= HIST_BINS:
+            i = HIST_BINS - 1
+        elif i < 0:
+            i = 0
+        self.counts[i] += 1
+        self.total += 1
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def percentile(self, p):
+        """p%点（マイクロ秒、区間の上端）"""
+        if self.total == 0:
+            return 0
+        target = math.ceil(self.total * p / 100)
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return (i + 1) * HIST_BIN_US
+        return HIST_BINS * HIST_BIN_US
+
+    def summary(self):
+        return (f'p50={self.percentile(50)}us p99={self.percentile(99)}us '
+                f'p99.9={self.percentile(99.9)}us max={self.max_ns // 1000}us')
+
+
+class RTLoop:
+    """周期 period 秒で callback() を呼ぶ
+
+    締め切りは start + k * period の絶対時刻。処理が周期を超えたら overrun を数え、
+    間に合わなかった周期は飛ばす（まとめて実行して取り戻すことはしない）。
+    """
+
+    def __init__(self, period, callback, spin_us=0):
+        self.period_ns = int(period * 1e9)
+        self.callback = callback
+        self.spin_ns = spin_us * 1000  # 最後の少しだけ busy wait してジッタを減らす
+        self.wakeup = Histogram()      # 締め切りから実際に起きるまでの遅れ
+        self.runtime = Histogram()     # callback の処理時間
+        self.cycles = 0
+        self.overruns = 0              # callback が次の締め切りを過ぎた回数
+        self.missed = 0                # 飛ばした周期の数
+        self._ts = Timespec()
+
+    def sleep_until(self, deadline_ns):
+        wake_ns = deadline_ns - self.spin_ns
+        if _libc is not None:
+            self._ts.tv_sec = wake_ns // 1_000_000_000
+            self._ts.tv_nsec = wake_ns % 1_000_000_000
+            while _libc.clock_nanosleep(CLOCK_MONOTONIC, TIMER_ABSTIME, ctypes.byref(self._ts), None):
+                pass  # シグナルで起こされたら寝直す
+        else:
+            delay = wake_ns - time.monotonic_ns()
+            if delay > 0:
+                time.sleep(delay / 1e9)
+        while time.monotonic_ns() < deadline_ns:
+            pass
+
+    def run(self, cycles):
+        period = self.period_ns
+        callback = self.callback
+        wakeup = self.wakeup
+        runtime = self.runtime
+
+        # ループ中に GC が走らないように、今あるオブジェクトは凍結して GC を止める
+        gc.collect()
+        gc.freeze()
+        gc.disable()
+        try:
+            deadline = time.monotonic_ns() + period
+            for _ in range(cycles):
+                self.sleep_until(deadline)
+                start = time.monotonic_ns()
+                wakeup.add(start - deadline)
+                callback()
+                end = time.monotonic_ns()
+                runtime.add(end - start)
+                self.cycles += 1
+
+                deadline += period
+                if end > deadline:
+                    self.overruns += 1
+                    skipped = (end - deadline) // period + 1
+                    self.missed += skipped
+                    deadline += skipped * period
+        finally:
+            gc.enable()
+            gc.unfreeze()
+
+    def report(self):
+        return (f'cycles={self.cycles} overruns={self.overruns} missed={self.missed}\n'
+                f'  wakeup latency: {self.wakeup.summary()}\n'
+                f'  callback time:  {self.runtime.summary()}')
+
+
+def set_realtime(priority=None, cpu=None):
+    """SCHED_FIFO・CPU固定・メモリのロック（権限がなければ警告だけ出す）"""
+    if cpu is not None:
+        os.sched_setaffinity(0, {cpu})
+    if priority is not None:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        except PermissionError:
+            print('Warning: SCHED_FIFO needs root (or CAP_SYS_NICE), running with normal priority')
+        if _libc is not None and _libc.mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+            print('Warning: mlockall failed, page faults may add latency')
+
+
+# ========== 入出力 ==========
+
+class SimPendulumIO:
+    """簡単な倒立振子の物理モデル（センサー値は MPU6050 の生の値で返す）"""
+
+    GRAVITY = 9.81
+    LENGTH = 0.08           # 重心までの高さ（m）
+    MOTOR_ACCEL = 0.012     # PWM 1 あたりの車輪の加速度（m/s^2）
+
+    def __init__(self, dt, angle_deg=3.0):
+        self.dt = dt
+        self.theta = math.radians(angle_deg)
+        self.omega = 0.0
+        self.ay = self.az = self.gx = 0
+        self.motor = 0
+
+    def read(self):
+        self.ay = int(16384 * math.sin(self.theta))
+        self.az = int(16384 * math.cos(self.theta))
+        self.gx = int(math.degrees(self.omega) * 131.0)
+
+    def write(self, motor_a, motor_b):
+        # 03_inverted_pendulum では motorA が逆向きに付いている
+        self.motor = (motor_b - motor_a) / 2
+        accel = self.motor * self.MOTOR_ACCEL
+        alpha = (self.GRAVITY * math.sin(self.theta) - accel * math.cos(self.theta)) / self.LENGTH
+        self.omega += alpha * self.dt
+        self.theta += self.omega * self.dt
+
+
+class PiIO:
+    """MPU6050（I2C）と motor_control.py の4本のピン（ソフトウェアPWM）"""
+
+    PWM_FREQ = 1000
+
+    def __init__(self):
+        from smbus2 import SMBus
+        from motor_control import GPIO, IN1, IN2, IN3, IN4
+        from mpu6050 import MPU6050
+        self.mpu = MPU6050(SMBus(1))
+        self.mpu.init()
+        self.pwm = [GPIO.PWM(pin, self.PWM_FREQ) for pin in (IN1, IN2, IN3, IN4)]
+        for p in self.pwm:
+            p.start(0)
+        self.ay = self.az = self.gx = 0
+
+    def read(self):
+        _, self.ay, self.az, self.gx, _, _ = self.mpu.read_sample()
+
+    def write(self, motor_a, motor_b):
+        a1, a2, b1, b2 = self.pwm
+        a1.ChangeDutyCycle(max(motor_a, 0) * 100 / 255)
+        a2.ChangeDutyCycle(max(-motor_a, 0) * 100 / 255)
+        b1.ChangeDutyCycle(max(motor_b, 0) * 100 / 255)
+        b2.ChangeDutyCycle(max(-motor_b, 0) * 100 / 255)
+
+    def stop(self):
+        for p in self.pwm:
+            p.stop()
+
+
+def balance_step(controller, io, dt):
+    """1周期分の処理（センサー → PID → モーター）"""
+    def step():
+        io.read()
+        if controller.update(io.ay, io.az, io.gx, dt):
+            io.write(controller.motor_a, controller.motor_b)
+        else:
+            io.write(0, 0)  # SAFETY STOP
+    return step
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Real-time balance loop')
+    parser.add_argument('--sim', action='store_true', help='use the simulated pendulum')
+    parser.add_argument('--period', type=float, default=0.01)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--fifo', type=int, metavar='PRIORITY', help='run with SCHED_FIFO at this priority')
+    parser.add_argument('--cpu', type=int, help='pin the loop to this CPU')
+    parser.add_argument('--spin-us', type=int, default=0, help='busy-wait this long before each deadline')
+    args = parser.parse_args()
+
+    set_realtime(args.fifo, args.cpu)
+    controller = BalanceController()
+    io = SimPendulumIO(args.period) if args.sim else PiIO()
+    loop = RTLoop(args.period, balance_step(controller, io, args.period), args.spin_us)
+
+    print('Balance loop start!')
+    try:
+        loop.run(int(args.seconds / args.period))
+    except KeyboardInterrupt:
+        print('\nStopping...')
+    finally:
+        io.write(0, 0)
+        if not args.sim:
+            io.stop()
+    print(loop.report())
+    print(f'final angle: {controller.angle:.2f} deg')
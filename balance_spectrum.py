@@ -0,0 +1,294 @@
+# 倒立振子のテレメトリ（03_inverted_pendulum.ino のデバッグ出力）の周波数解析
+# "Angle:x Err:y Out:z" の行から、振動の周波数・減衰の度合い・リミットサイクルを調べて
+# Kp / Kd をどちらに動かせばよいかの目安を出す
+#
+# ファイルは少しずつ読み、Welch 法の平均スペクトルを足し込んでいくので、
+# 何時間分のログでもメモリに全部載せることはない。
+# SAFETY STOP・再起動・PID の変更（"--- Current PID ---"）でログを区切り、区間ごとにまとめる。
+#
+# 使い方:
+#   python3 balance_spectrum.py capture.log                    # シリアルのログ（100Hz）
+#   python3 balance_spectrum.py sse.log --rate 10              # /events を保存したもの（10Hz）
+#   cat /dev/ttyUSB0 | python3 balance_spectrum.py - --json    # 標準入力から
+
+import argparse
+import json
+import math
+import re
+import sys
+
+import numpy as np
+
+SAMPLE_RATE = 100.0   # CONTROL_PERIOD_MS = 10
+NPERSEG = 1024        # 1区間のサンプル数（100Hz で約10秒、周波数分解能 約0.1Hz）
+CHUNK_BYTES = 1 << 20
+PWM_MAX = 255
+CHANNELS = ('angle', 'err', 'out')
+
+TELEMETRY_RE = re.compile(r'Angle:(-?[\d.]+) Err:(-?[\d.]+) Out:(-?\d+)')
+# SAFETY STOP・起動メッセージ・PID の表示で区切る（re.split のグループ）
+EVENT_RE = re.compile(r'(SAFETY STOP|Inverted Pendulum Start!)|\b(Kp|Ki|Kd|target)=(-?[\d.]+)')
+
+LIMIT_CYCLE_PEAK_RATIO = 0.3  # ピーク付近のパワーが全体に占める割合
+LIMIT_CYCLE_FRACTION = 0.7    # その状態が続いている区間の割合
+
+
+class SpectrumAccumulator:
+    """1チャンネル分の Welch PSD を少しずつ足し込む
+
+    nperseg サンプルごとに半分ずつずらして区切り、平均を引いて窓をかけて FFT する。
+    区間ごとの最大ピークの周波数と、ピーク付近のパワーの割合も残しておく
+    （周波数が時間とともに変わるか・振動が続いているかを見るため）。
+    """
+
+    def __init__(self, fs, nperseg=NPERSEG):
+        self.fs = fs
+        self.nperseg = nperseg
+        self.step = nperseg // 2
+        self.window = np.hanning(nperseg + 1)[:-1]  # 周期的な Hann 窓（scipy の get_window('hann') と同じ）
+        self.scale = 1.0 / (fs * (self.window ** 2).sum())
+        self.freqs = np.fft.rfftfreq(nperseg, 1 / fs)
+        self.power = np.zeros(len(self.freqs))
+        self.segments = 0
+        self.pending = np.empty(0)
+        self.peak_freqs = []
+        self.peak_ratios = []
+
+    def add(self, x):
+        buf = np.concatenate((self.pending, x))
+        n = (len(buf) - self.nperseg) // self.step + 1 if len(buf) >= self.nperseg else 0
+        if n > 0:
+            segs = np.lib.stride_tricks.sliding_window_view(buf, self.nperseg)[::self.step][:n]
+            segs = (segs - segs.mean(axis=1, keepdims=True)) * self.window
+            p = np.abs(np.fft.rfft(segs, axis=1)) ** 2
+            self.power += p.sum(axis=0)
+            self.segments += n
+            peak = p[:, 1:].argmax(axis=1) + 1
+            band = _band_power(p, peak)
+            total = p[:, 1:].sum(axis=1)
+            self.peak_freqs.extend(self.freqs[peak])
+            self.peak_ratios.extend(np.divide(band, total, out=np.zeros_like(band), where=total > 0))
+        self.pending = buf[n * self.step:]
+
+    def psd(self):
+        """片側のパワースペクトル密度（scipy.signal.welch の scaling='density' と同じ）"""
+        if self.segments == 0:
+            return self.freqs, np.zeros_like(self.power)
+        psd = self.power / self.segments * self.scale
+        psd[1:-1 if self.nperseg % 2 == 0 else None] *= 2
+        return self.freqs, psd
+
+
+def _band_power(p, peak, width=2):
+    """各行の peak ± width ビンのパワーの合計"""
+    idx = np.clip(peak[:, None] + np.arange(-width, width + 1), 1, p.shape[1] - 1)
+    return np.take_along_axis(p, idx, axis=1).sum(axis=1)
+
+
+def half_power_damping(freqs, psd, peak):
+    """ピークの半値幅から減衰比を求める（ζ ≈ (f2 - f1) / 2f0）
+
+    パワーが半分になる周波数は隣のビンとの間を直線補間する。
+    返り値: (ζ, 周波数分解能で決まる下限に張り付いているか)
+    """
+    half = psd[peak] / 2
+    lo = peak
+    while lo > 1 and psd[lo - 1] > half:
+        lo -= 1
+    hi = peak
+    while hi < len(psd) - 1 and psd[hi + 1] > half:
+        hi += 1
+    df = freqs[1] - freqs[0]
+    f1 = freqs[lo] - df * (psd[lo] - half) / max(psd[lo] - psd[lo - 1], 1e-30)
+    f2 = freqs[hi] + df * (psd[hi] - half) / max(psd[hi] - psd[min(hi + 1, len(psd) - 1)], 1e-30)
+    f1 = max(f1, freqs[lo] - df)
+    f2 = min(f2, freqs[hi] + df)
+    zeta = (f2 - f1) / (2 * freqs[peak])
+    return float(zeta), hi == lo
+
+
+class Run:
+    """区切りと区切りの間のテレメトリ"""
+
+    def __init__(self, index, fs, nperseg, gains):
+        self.index = index
+        self.fs = fs
+        self.gains = dict(gains)
+        self.count = 0
+        self.sums = np.zeros(3)
+        self.sumsq = np.zeros(3)
+        self.peak = np.zeros(3)
+        self.saturated = 0
+        self.safety_stop = False
+        self.spectra = {name: SpectrumAccumulator(fs, nperseg) for name in CHANNELS}
+
+    def add(self, data):
+        """data: (n, 3) の配列（Angle, Err, Out）"""
+        self.count += len(data)
+        self.sums += data.sum(axis=0)
+        self.sumsq += (data ** 2).sum(axis=0)
+        self.peak = np.maximum(self.peak, np.abs(data).max(axis=0))
+        self.saturated += int((np.abs(data[:, 2]) >= PWM_MAX).sum())
+        for i, name in enumerate(CHANNELS):
+            self.spectra[name].add(data[:, i])
+
+    def summary(self):
+        n = max(self.count, 1)
+        mean = self.sums / n
+        std = np.sqrt(np.maximum(self.sumsq / n - mean ** 2, 0))
+        result = {
+            'run': self.index,
+            'samples': self.count,
+            'seconds': round(self.count / self.fs, 1),
+            'gains': self.gains,
+            'ended_by_safety_stop': self.safety_stop,
+            'err_mean': round(float(mean[1]), 3),
+            'angle_std': round(float(std[0]), 3),
+            'angle_peak': round(float(self.peak[0]), 2),
+            'out_std': round(float(std[2]), 1),
+            'saturation': round(self.saturated / n, 4),
+        }
+
+        spec = self.spectra['angle']
+        if spec.segments == 0:
+            result['note'] = f'too short for spectral analysis (need {spec.nperseg} samples)'
+            result['hints'] = hints(result)
+            return result
+
+        freqs, psd = spec.psd()
+        peak = int(psd[1:].argmax()) + 1
+        zeta, at_resolution = half_power_damping(freqs, psd, peak)
+        peak_freqs = np.asarray(spec.peak_freqs)
+        peak_ratios = np.asarray(spec.peak_ratios)
+        df = freqs[1]
+        steady = (np.abs(peak_freqs - freqs[peak]) <= max(0.15 * freqs[peak], df)) \
+            & (peak_ratios >= LIMIT_CYCLE_PEAK_RATIO)
+        band = slice(max(peak - 2, 1), peak + 3)
+        result.update({
+            'dominant_hz': round(float(freqs[peak]), 3),
+            'resolution_hz': round(float(df), 3),
+            'damping_ratio': round(zeta, 3),
+            'damping_at_resolution_limit': at_resolution,
+            # 正弦波の振幅 = sqrt(2 * 帯域のパワー)
+            'oscillation_amplitude_deg': round(float(np.sqrt(2 * psd[band].sum() * df)), 3),
+            'peak_power_ratio': round(float(np.median(peak_ratios)), 3),
+            'frequency_drift_hz': round(float(peak_freqs.std()), 3),
+            'limit_cycle': bool(steady.mean() >= LIMIT_CYCLE_FRACTION),
+            'segments': spec.segments,
+        })
+        result['hints'] = hints(result)
+        return result
+
+
+def hints(s):
+    """要約から Kp / Kd の調整の目安を作る（経験則）"""
+    out = []
+    if s['saturation'] > 0.1:
+        out.append(f'Out is saturated {s["saturation"]:.0%} of the time: lower Kp or check the balance point')
+    if abs(s['err_mean']) > 1.0:
+        out.append(f'steady lean of {s["err_mean"]:+.1f} deg: set Target Angle to '
+                   f'{s["gains"].get("target", 0.0) + s["err_mean"]:.2f} or raise Ki a little')
+    f = s.get('dominant_hz')
+    if f is None:
+        return out
+    oscillating = s['limit_cycle'] or s['damping_ratio'] < 0.1
+    if oscillating and f >= 5:
+        out.append(f'fast {f:.1f} Hz oscillation: Kd too high (or gyro noise), lower Kd by ~20%')
+    elif oscillating and f >= 0.5:
+        out.append(f'{f:.1f} Hz sway with little damping: raise Kd by ~20% (or lower Kp)')
+    elif oscillating:
+        out.append(f'slow {f:.2f} Hz wander: raise Kp by ~10%')
+    if s['ended_by_safety_stop'] and not out:
+        out.append('fell over without a clear oscillation: raise Kp')
+    if not out:
+        out.append('well damped, no change needed')
+    return out
+
+
+def read_chunks(f, chunk_bytes=CHUNK_BYTES):
+    """行の途中で切れないように chunk_bytes ずつテキストを返す"""
+    rest = b''
+    while True:
+        block = f.read(chunk_bytes)
+        if not block:
+            break
+        block = rest + block
+        cut = block.rfind(b'\n') + 1
+        rest = block[cut:]
+        if cut:
+            yield block[:cut].decode('utf-8', 'replace')
+    if rest:
+        yield rest.decode('utf-8', 'replace')
+
+
+def analyze(f, fs=SAMPLE_RATE, nperseg=NPERSEG, chunk_bytes=CHUNK_BYTES, min_samples=1):
+    """ログを少しずつ読み、区間が終わるたびにその要約（dict）を返す"""
+    gains = {}
+    index = 0
+    run = Run(index, fs, nperseg, gains)
+
+    def finish(run):
+        return run.summary() if run.count >= min_samples else None
+
+    for text in read_chunks(f, chunk_bytes):
+        parts = EVENT_RE.split(text)
+        # parts: [テキスト, 停止/起動, ゲイン名, 値, テキスト, ...]
+        for i in range(0, len(parts), 4):
+            rows = TELEMETRY_RE.findall(parts[i])
+            if rows:
+                run.add(np.array(rows, float))
+            if i + 1 >= len(parts):
+                break
+            stop, name, value = parts[i + 1:i + 4]
+            if stop:
+                run.safety_stop = stop == 'SAFETY STOP'
+            elif gains.get(name) != float(value):
+                gains[name] = float(value)
+                if run.count == 0:
+                    run.gains = dict(gains)
+                    continue
+            else:
+                continue
+            summary = finish(run)
+            if summary:
+                yield summary
+            index += 1
+            run = Run(index, fs, nperseg, gains)
+    summary = finish(run)
+    if summary:
+        yield summary
+
+
+def format_summary(s):
+    gains = ' '.join(f'{k}={v:g}' for k, v in s['gains'].items()) or 'gains unknown'
+    lines = [f'Run {s["run"]}: {s["seconds"]} s ({gains})'
+             + ('  ended by SAFETY STOP' if s['ended_by_safety_stop'] else '')]
+    lines.append(f'  angle std {s["angle_std"]:.2f} deg, peak {s["angle_peak"]:.1f} deg, '
+                 f'mean err {s["err_mean"]:+.2f} deg, Out saturated {s["saturation"]:.1%}')
+    if 'dominant_hz' in s:
+        zeta = ('<' if s['damping_at_resolution_limit'] else '') + f'{s["damping_ratio"]:.3f}'
+        lines.append(f'  dominant {s["dominant_hz"]:.2f} Hz (±{s["resolution_hz"] / 2:.2f}), '
+                     f'amplitude {s["oscillation_amplitude_deg"]:.2f} deg, damping ratio {zeta}')
+        lines.append(f'  limit cycle: {"YES" if s["limit_cycle"] else "no"} '
+                     f'(peak power {s["peak_power_ratio"]:.0%}, drift {s["frequency_drift_hz"]:.2f} Hz, '
+                     f'{s["segments"]} segments)')
+    else:
+        lines.append(f'  {s["note"]}')
+    lines += [f'  -> {h}' for h in s['hints']]
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Spectral analysis of balance telemetry')
+    parser.add_argument('capture', help="log file with 'Angle:x Err:y Out:z' lines, or - for stdin")
+    parser.add_argument('--rate', type=float, default=SAMPLE_RATE, help='telemetry lines per second')
+    parser.add_argument('--nperseg', type=int, default=NPERSEG, help='samples per FFT segment')
+    parser.add_argument('--min-seconds', type=float, default=1.0, help='skip runs shorter than this')
+    parser.add_argument('--json', action='store_true', help='print one JSON object per run')
+    args = parser.parse_args()
+
+    f = sys.stdin.buffer if args.capture == '-' else open(args.capture, 'rb')
+    min_samples = max(1, math.ceil(args.min_seconds * args.rate))
+    with f:
+        for summary in analyze(f, args.rate, args.nperseg, min_samples=min_samples):
+            print(json.dumps(summary) if args.json else format_summary(summary), flush=True)
@@ -0,0 +1,442 @@
+# ベンチマーク
+# シミュレーション（sim_gpio、fusion_sim）上で各スクリプトの重い処理の時間を測る
+# 結果は bench_history.jsonl に1行ずつ追記し、前回までと比べて遅くなったものを表示する
+#
+# 使い方:
+#   python3 bench.py                    # 全部実行
+#   python3 bench.py pid fusion         # 名前にその文字を含むものだけ
+#   python3 bench.py --threshold 0.3    # 30%以上遅くなったら警告（デフォルト20%）
+#   python3 bench.py --no-save          # 履歴に保存しない
+#
+# 遅くなったものがあれば終了コード1を返す
+# （OS のスリープ精度を測るものなど、ばらつきの大きいものは表示だけで判定しない）
+
+import argparse
+import atexit
+import contextlib
+import datetime
+import http.client
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+HISTORY_PATH = os.path.join(ROOT, 'bench_history.jsonl')
+BASELINE_RUNS = 5  # 比較には同じマシンの直近5回の中央値を使う
+
+# 実機・本番のファイルを触らないように、import より前に設定する
+_tmp = tempfile.mkdtemp(prefix='bench_')
+atexit.register(shutil.rmtree, _tmp, True)
+os.environ['GPIO_SIM'] = '1'
+os.environ['STATE_BUS_PATH'] = os.path.join(_tmp, 'state_bus')
+os.environ['MOTION_LOG_PATH'] = os.path.join(_tmp, 'motion.log')
+
+import sim_gpio  # noqa: E402
+
+BENCHMARKS = []
+
+
+def benchmark(name, gate=True):
+    """gate=False のものは結果を表示・保存するだけで、遅くなっても失敗にしない"""
+    def register(func):
+        BENCHMARKS.append((name, func, gate))
+        return func
+    return register
+
+
+def measure(func, number, repeat):
+    """func を number 回呼ぶのを repeat 回繰り返し、1回あたりの秒数のリストを返す"""
+    for _ in range(max(number // 10, 1)):  # ウォームアップ
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return samples
+
+
+@contextlib.contextmanager
+def quiet():
+    """スクリプトの print を捨てる"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+# ========== motor_control.py ==========
+
+@benchmark('motor_pin_writes')
+def bench_motor():
+    from motor_control import MOTIONS
+    names = list(MOTIONS)
+    i = 0
+
+    def step():
+        nonlocal i
+        MOTIONS[names[i % len(names)]]()
+        i += 1
+
+    with quiet():
+        return measure(step, 2000, 20)
+
+
+@benchmark('rc_server_roundtrip')
+def bench_rc_server():
+    import asyncio
+    import rc_server
+
+    ready = threading.Event()
+    state = {}
+
+    async def serve():
+        queue = rc_server.CommandQueue(rc_server.MOTIONS)
+        worker = asyncio.create_task(queue.run())
+        server = await asyncio.start_server(rc_server.RCServer(queue, b'').handle, '127.0.0.1', 0)
+        state['port'] = server.sockets[0].getsockname()[1]
+        state['loop'] = asyncio.get_running_loop()
+        state['stop'] = asyncio.Event()
+        ready.set()
+        async with server:
+            await state['stop'].wait()
+        worker.cancel()
+        queue.executor.shutdown()
+
+    thread = threading.Thread(target=asyncio.run, args=(serve(),))
+    with quiet():
+        thread.start()
+        ready.wait()
+        conn = http.client.HTTPConnection('127.0.0.1', state['port'])  # keep-alive
+
+        def step():
+            conn.request('GET', '/forward')
+            conn.getresponse().read()
+
+        try:
+            return measure(step, 200, 10)
+        finally:
+            conn.close()
+            state['loop'].call_soon_threadsafe(state['stop'].set)
+            thread.join()
+
+
+# ========== fade.py ==========
+
+@benchmark('fade_frame_overhead', gate=False)
+def bench_fade():
+    """1フレームあたり、指定の待ち時間からどれだけ遅れるか（ほぼ time.sleep の精度なので判定しない）"""
+    sim_gpio.install_gpiozero()
+    import fade
+    delay = 0.002
+    led = fade.PWMLED(17)
+    samples = []
+    for _ in range(10):
+        start = time.perf_counter()
+        fade.fade_in(led, delay)
+        samples.append((time.perf_counter() - start) / 101 - delay)
+    return samples
+
+
+# ========== pir_led.py ==========
+
+def _pir_setup():
+    import pir_led
+    from motion_log import MotionRing
+    from state_bus import StateBus
+    sim_gpio.setmode(sim_gpio.BCM)
+    sim_gpio.setup(pir_led.PIR_PIN, sim_gpio.IN, pull_up_down=sim_gpio.PUD_DOWN)
+    sim_gpio.setup(pir_led.LED_PIN, sim_gpio.OUT)
+    return pir_led, pir_led.MotionWatcher(StateBus(), MotionRing())
+
+
+@benchmark('pir_poll_edge')
+def bench_pir_poll():
+    """検知の開始・終了があったときの poll() 1回の処理時間"""
+    pir_led, watcher = _pir_setup()
+    level = 0
+
+    def step():
+        nonlocal level
+        level ^= 1
+        sim_gpio.set_input(pir_led.PIR_PIN, level)
+        watcher.poll()
+
+    with quiet():
+        return measure(step, 500, 10)
+
+
+@benchmark('pir_reaction_latency', gate=False)
+def bench_pir_reaction():
+    """センサーが反応してから LED が変わるまでの時間（POLL_INTERVAL ごとの監視ループ込み）
+
+    ほとんどは次の poll() までの待ち（0〜POLL_INTERVAL の一様分布）なので、
+    実際の反応時間の目安として表示するだけで判定しない（処理時間は pir_poll_edge）。
+    """
+    pir_led, watcher = _pir_setup()
+    changed = threading.Event()
+    running = True
+
+    def on_output(channels, values):
+        if pir_led.LED_PIN in channels:
+            changed.set()
+
+    def loop():
+        while running:
+            watcher.poll()
+            time.sleep(pir_led.POLL_INTERVAL)
+
+    sim_gpio.listeners.append(on_output)
+    thread = threading.Thread(target=loop)
+    samples = []
+    with quiet():
+        thread.start()
+        try:
+            for i in range(20):
+                time.sleep(random.uniform(0, pir_led.POLL_INTERVAL))
+                changed.clear()
+                start = time.perf_counter()
+                sim_gpio.set_input(pir_led.PIR_PIN, (i + 1) % 2)
+                changed.wait()
+                samples.append(time.perf_counter() - start)
+        finally:
+            running = False
+            thread.join()
+            sim_gpio.listeners.remove(on_output)
+    return samples
+
+
+# ========== 03_inverted_pendulum.ino の制御則 ==========
+
+@benchmark('pid_update')
+def bench_pid():
+    from balance import BalanceController
+    ctrl = BalanceController()
+    readings = [(random.randint(-800, 800), 16384 + random.randint(-500, 500),
+                 random.randint(-300, 300)) for _ in range(256)]
+    i = 0
+
+    def step():
+        nonlocal i
+        ay, az, gx = readings[i & 255]
+        ctrl.update(ay, az, gx, 0.01)
+        i += 1
+
+    return measure(step, 5000, 20)
+
+
+@benchmark('balance_loop_step')
+def bench_balance_loop_step():
+    """センサー読み出し・PID・モーター出力の1周期分（シミュレーションの振子）"""
+    from balance import BalanceController
+    from balance_loop import SimPendulumIO, balance_step
+    pendulum = SimPendulumIO(0.01, angle_deg=1.0)
+    return measure(balance_step(BalanceController(), pendulum, 0.01), 5000, 20)
+
+
+# ========== mpu6050.py ==========
+
+def _mpu_setup():
+    from mpu6050 import MPU6050
+    from sim_i2c import SimI2CBus, SimMPU6050
+    clock = [0.0]
+    bus = SimI2CBus({0x68: SimMPU6050(clock=lambda: clock[0])})
+    mpu = MPU6050(bus, sample_rate=200)
+    mpu.init()
+    return mpu, clock
+
+
+@benchmark('mpu6050_fifo_per_sample')
+def bench_mpu_fifo():
+    """FIFO から40サンプルずつ読むときの1サンプルあたりの時間"""
+    mpu, clock = _mpu_setup()
+
+    def step():
+        clock[0] += 40 / 200
+        mpu.read_fifo()
+
+    return [t / 40 for t in measure(step, 200, 10)]
+
+
+@benchmark('mpu6050_poll_per_sample')
+def bench_mpu_poll():
+    """1サンプルごとに14バイト読むとき（.ino と同じ方法）"""
+    mpu, clock = _mpu_setup()
+
+    def step():
+        clock[0] += 1 / 200
+        mpu.read_sample()
+
+    return measure(step, 1000, 10)
+
+
+# ========== state_bus.py / motion_log.py ==========
+
+@benchmark('state_bus_write_read')
+def bench_state_bus():
+    from state_bus import StateBus, SLOT_LED
+    bus = StateBus()
+
+    def step():
+        bus.write(SLOT_LED, value=500)
+        bus.read(SLOT_LED)
+
+    return measure(step, 5000, 20)
+
+
+@benchmark('motion_occupancy_90d')
+def bench_motion_query():
+    import motion_log
+    path = os.path.join(_tmp, 'motion_90d.log')
+    base = 1_700_000_000 * 10**9
+    ring = motion_log.MotionRing(path=path)
+    for k in range(90 * 144):  # 10分ごとに2分間の検知
+        ring.record(1, base + k * 600 * 10**9)
+        ring.record(0, base + (k * 600 + 120) * 10**9)
+    ring.flush()
+    end = base + 90 * 86400 * 10**9
+
+    def step():
+        motion_log.occupancy(base, end, 3600 * 10**9, path)
+        motion_log.event_rate(base, end, 3600 * 10**9, path)
+
+    return measure(step, 20, 10)
+
+
+# ========== Fusion 360 スクリプト ==========
+
+FUSION_SCRIPTS = {
+    'floor_plate': 'esp32_rc_car/fusion/FloorPlate.py',
+    'chassis': 'original_car/chassis/chassis.py',
+    'wheel_spoke': 'original_car/wheel_spoke/wheel_spoke.py',
+    'axle': 'original_car/axle/axle.py',
+    'axle_holder': 'original_car/axle_holder/axle_holder.py',
+}
+
+
+def _fusion_bench(path):
+    def bench():
+        import fusion_sim
+        run = fusion_sim.load_script(os.path.join(ROOT, path))
+        return measure(lambda: fusion_sim.run_script(run), 100, 10)
+    return bench
+
+
+for _name, _path in FUSION_SCRIPTS.items():
+    benchmark('fusion_build_' + _name)(_fusion_bench(_path))
+
+
+@benchmark('print_cost_wheel_variant')
+def bench_print_cost():
+    """スポーク本数を変えた1案の見積もり（プロファイルのキャッシュあり）"""
+    import print_cost
+    path = os.path.join(ROOT, FUSION_SCRIPTS['wheel_spoke'])
+    raster = print_cost.Rasterizer()
+    spokes = itertools.cycle((3, 4, 5, 6))
+
+    def step():
+        (_, geoms), = print_cost.script_variants(path, {'num_spokes': [next(spokes)]}, raster)
+        print_cost.estimate(geoms)
+
+    return measure(step, 20, 10)
+
+
+# ========== 実行・比較 ==========
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        'median': statistics.median(samples),
+        'p95': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        'min': samples[0],
+        'n': len(samples),
+    }
+
+
+def load_history(path, host):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        runs = [json.loads(line) for line in f if line.strip()]
+    return [run for run in runs if run.get('host') == host]
+
+
+def baseline(history, name):
+    values = [run['results'][name]['median'] for run in history if name in run['results']]
+    values = values[-BASELINE_RUNS:]
+    return statistics.median(values) if values else None
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_time(seconds):
+    if abs(seconds) < 1e-3:
+        return f'{seconds * 1e6:9.2f} us'
+    return f'{seconds * 1e3:9.3f} ms'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run benchmarks against simulated backends')
+    parser.add_argument('filters', nargs='*', help='run only benchmarks whose name contains one of these')
+    parser.add_argument('--threshold', type=float, default=0.2, help='regression threshold (0.2 = 20%%)')
+    parser.add_argument('--history', default=HISTORY_PATH)
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args()
+
+    host = platform.node()
+    history = load_history(args.history, host)
+    results = {}
+    regressions = []
+
+    print(f'{"benchmark":28s} {"median":>12s} {"p95":>12s} {"baseline":>12s}  change')
+    for name, func, gate in BENCHMARKS:
+        if args.filters and not any(f in name for f in args.filters):
+            continue
+        results[name] = summarize(func())
+        median = results[name]['median']
+        base = baseline(history, name)
+        line = f'{name:28s} {format_time(median)} {format_time(results[name]["p95"])}'
+        if base:
+            change = median / base - 1
+            line += f' {format_time(base)}  {change * 100:+6.1f}%'
+            if not gate:
+                line += '  (not gated)'
+            elif change > args.threshold:
+                line += '  << REGRESSION'
+                regressions.append(name)
+        print(line)
+
+    if not args.no_save:
+        record = {
+            'time': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'host': host,
+            'python': platform.python_version(),
+            'results': results,
+        }
+        with open(args.history, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    if regressions:
+        print(f'\n{len(regressions)} regression(s) over {args.threshold * 100:.0f}%: {", ".join(regressions)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+# RPi.GPIO 互換のモジュール（gpio_daemon.py 経由）
+# GPIO の初期化はデーモンが済ませているので import してすぐ使え、
+# ピンの取り合いはデーモンが調停する（他のクライアントが使っているピンは GPIOError）
+#
+# 使い方:
+#   python3 gpio_daemon.py &
+#   GPIO_DAEMON=1 python3 motor_control.py
+#   GPIO_DAEMON=1 python3 pir_led.py
+#   （GPIO_SIM の sim_gpio.py と同じく、import RPi.GPIO as GPIO の代わりに使う）
+#
+# モーターの4本のピンはデーモンが管理するので setup() できない（BUSY になる）。
+# 代わりに motion() で4本まとめて切り替える（motor_control.py が使う）
+
+import threading
+
+from gpio_client import (
+    GPIOClient, GPIOError, MOTION_NAMES, PULL_OFF, PULL_DOWN, PULL_UP,
+)
+
+BCM = 11
+BOARD = 10
+OUT = 0
+IN = 1
+LOW = 0
+HIGH = 1
+PUD_OFF = 20
+PUD_DOWN = 21
+PUD_UP = 22
+
+PULLS = {PUD_OFF: PULL_OFF, PUD_DOWN: PULL_DOWN, PUD_UP: PULL_UP}
+
+_lock = threading.Lock()  # 1本の接続を複数のスレッドから使うので、リクエストを1つずつ送る
+_client = None
+_mode = None
+
+
+def _gpio():
+    global _client
+    if _client is None:
+        _client = GPIOClient()
+    return _client
+
+
+def setmode(mode):
+    global _mode
+    _mode = mode
+
+
+def getmode():
+    return _mode
+
+
+def setwarnings(flag):
+    pass
+
+
+def setup(channel, direction, pull_up_down=PUD_OFF, initial=LOW):
+    for ch in _channels(channel):
+        with _lock:
+            if direction == OUT:
+                _gpio().setup_output(ch)
+                _gpio().output(ch, initial)
+            else:
+                _gpio().setup_input(ch, PULLS[pull_up_down])
+
+
+def output(channel, value):
+    channels = _channels(channel)
+    values = value if isinstance(value, (list, tuple)) else [value] * len(channels)
+    with _lock:
+        for ch, v in zip(channels, values):
+            _gpio().output(ch, v)
+
+
+def input(channel):
+    with _lock:
+        return _gpio().input(channel)
+
+
+def motion(name):
+    """モーターの4本をまとめて切り替える（MOTION_NAMES の1つ）"""
+    if name not in MOTION_NAMES:
+        raise ValueError(f'unknown motion: {name}')
+    with _lock:
+        _gpio().motion(name)
+
+
+def PWM(channel, frequency):
+    raise GPIOError('software PWM is not available through gpio_daemon.py')
+
+
+def cleanup(channel=None):
+    """占有していたピンを手放す（channel なしなら接続ごと閉じる）"""
+    global _client, _mode
+    with _lock:
+        if _client is None:
+            return
+        if channel is None:
+            _client.close()
+            _client = None
+            _mode = None
+        else:
+            for ch in _channels(channel):
+                _client.release(ch)
+
+
+def _channels(channel):
+    if isinstance(channel, (list, tuple)):
+        return list(channel)
+    return [channel]
@@ -17,6 +17,12 @@ const char* password = "12345678";  // 8文字以上必要
 // Webサーバー（ポート80）
 WebServer server(80);
 
+// 遅延の計測（latency_trace.py）: ?id= 付きのリクエストには X-Trace ヘッダーで
+// 受信・解析・digitalWrite 完了・返信の時刻（micros）を返す
+String traceId = "";
+unsigned long traceRecv = 0;
+unsigned long traceParse = 0;
+
 void setup() {
   Serial.begin(115200);
 
@@ -71,49 +77,54 @@ void handleRoot() {
 
 // 前進
 void handleForward() {
+  traceBegin();
   Serial.println("Forward");
   digitalWrite(IN1, HIGH);
   digitalWrite(IN2, LOW);
   digitalWrite(IN3, HIGH);
   digitalWrite(IN4, LOW);
-  server.send(200, "text/plain", "OK: Forward");
+  sendTraced("OK: Forward");
 }
 
 // 後退
 void handleBackward() {
+  traceBegin();
   Serial.println("Backward");
   digitalWrite(IN1, LOW);
   digitalWrite(IN2, HIGH);
   digitalWrite(IN3, LOW);
   digitalWrite(IN4, HIGH);
-  server.send(200, "text/plain", "OK: Backward");
+  sendTraced("OK: Backward");
 }
 
 // 左旋回
 void handleLeft() {
+  traceBegin();
   Serial.println("Left");
   digitalWrite(IN1, LOW);
   digitalWrite(IN2, HIGH);
   digitalWrite(IN3, HIGH);
   digitalWrite(IN4, LOW);
-  server.send(200, "text/plain", "OK: Left");
+  sendTraced("OK: Left");
 }
 
 // 右旋回
 void handleRight() {
+  traceBegin();
   Serial.println("Right");
   digitalWrite(IN1, HIGH);
   digitalWrite(IN2, LOW);
   digitalWrite(IN3, LOW);
   digitalWrite(IN4, HIGH);
-  server.send(200, "text/plain", "OK: Right");
+  sendTraced("OK: Right");
 }
 
 // 停止
 void handleStop() {
+  traceBegin();
   Serial.println("Stop");
   stopMotor();
-  server.send(200, "text/plain", "OK: Stop");
+  sendTraced("OK: Stop");
 }
 
 // モーター停止
@@ -123,3 +134,22 @@ void stopMotor() {
   digitalWrite(IN3, LOW);
   digitalWrite(IN4, LOW);
 }
+
+// ハンドラが呼ばれた時刻（ヘッダーの解析は WebServer が済ませている）と id を読んだ時刻
+void traceBegin() {
+  traceRecv = micros();
+  traceId = server.hasArg("id") ? server.arg("id") : "";
+  traceParse = micros();
+}
+
+// digitalWrite が終わったところで呼ぶ
+void sendTraced(const char* message) {
+  if (traceId.length() > 0) {
+    unsigned long act = micros();
+    String trace = "id=" + traceId + " recv=" + String(traceRecv) + " parse=" + String(traceParse)
+                 + " act=" + String(act) + " reply=" + String(micros());
+    server.sendHeader("X-Trace", trace);
+    server.sendHeader("Access-Control-Expose-Headers", "X-Trace");
+  }
+  server.send(200, "text/plain", message);
+}
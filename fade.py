@@ -1,20 +1,70 @@
+import argparse
 from gpiozero import PWMLED
 from time import sleep
 
-led = PWMLED(17)
+from state_bus import StateBus, SLOT_PIR, SLOT_LED
 
-print('LED fade start!')
+FRAME_DELAY = 0.02
+MOTION_LED_PIN = 18  # pir_led.py が17番を直接点灯するので、--motion では別のLEDを使う
 
-# ゆっくり明るくする（0%から100%へ）
-print('Fading in...')
-for brightness in range(0, 101, 1):
-    led.value = brightness / 100.0
-    sleep(0.02)
 
-# ゆっくり暗くする（100%から0%へ）
-print('Fading out...')
-for brightness in range(100, -1, -1):
-    led.value = brightness / 100.0
-    sleep(0.02)
+def fade_in(led, delay=FRAME_DELAY):
+    """ゆっくり明るくする（0%から100%へ）"""
+    for brightness in range(0, 101, 1):
+        led.value = brightness / 100.0
+        sleep(delay)
 
-print('Done!')
+
+def fade_out(led, delay=FRAME_DELAY):
+    """ゆっくり暗くする（100%から0%へ）"""
+    for brightness in range(100, -1, -1):
+        led.value = brightness / 100.0
+        sleep(delay)
+
+
+def follow_motion(led, bus, delay=FRAME_DELAY):
+    """pir_led.py の検知状態に合わせてフェードする（動いている間だけ1%ずつ進める）
+
+    フェードの途中で検知が終われば、そこから暗くしていく。明るさが目標に着いたら
+    次の書き込みまで bus.wait() で眠る。明るさは SLOT_LED に書いて他のプロセスに知らせる。
+    """
+    brightness = 0
+    while True:
+        target = 100 if bus.read(SLOT_PIR).value else 0
+        if brightness == target:
+            bus.wait()
+            continue
+        brightness += 1 if target > brightness else -1
+        led.value = brightness / 100.0
+        bus.write(SLOT_LED, value=brightness * 10)
+        sleep(delay)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='LED fade')
+    parser.add_argument('--motion', action='store_true',
+                        help='fade in/out following pir_led.py through the state bus')
+    parser.add_argument('--pin', type=int, help='LED pin (default 17, or 18 with --motion)')
+    args = parser.parse_args()
+
+    if args.motion:
+        led = PWMLED(args.pin or MOTION_LED_PIN)
+        bus = StateBus(wakeup=True)
+        print('LED fade following motion! (run pir_led.py)')
+        try:
+            follow_motion(led, bus)
+        except KeyboardInterrupt:
+            print('\nStopping...')
+            bus.close()
+    else:
+        led = PWMLED(args.pin or 17)
+
+        print('LED fade start!')
+
+        print('Fading in...')
+        fade_in(led)
+
+        print('Fading out...')
+        fade_out(led)
+
+        print('Done!')
@@ -0,0 +1,361 @@
+# 複数台のロボットをまとめて操作・監視する（asyncio）
+# ロボットごとに keep-alive 接続を1本ずつ持ち、同じコマンドを全台へ同時に送る
+#
+# 対応しているロボット:
+#   rc       … esp32_rc_car.ino / rc_server.py（/forward /backward /left /right /stop）
+#   balance  … 03_inverted_pendulum.ino（/steer?f=&t=  /cmd?c=  /events）
+# どちらも soft-AP なので、PC から全台の IP に届くようにしておくこと
+# （Wi-Fi アダプタを複数使う・スケッチをステーションモードにする など）。
+#
+# 使い方:
+#   python3 fleet.py --robot rc:192.168.4.1 --robot balance:192.168.5.1 health
+#   python3 fleet.py --robot ... telemetry          # balance の /events から1行ずつ読む
+#   python3 fleet.py --robot ... motion forward     # rc は /forward、balance は /steer に変換
+#   python3 fleet.py --robot ... steer 0.5 -0.2
+#   python3 fleet.py --robot ... cmd P40
+#   python3 fleet.py --demo 1,4,16,64               # ローカルの代役で、台数を増やしたときの遅延を測る
+
+import argparse
+import asyncio
+import contextlib
+import io
+import multiprocessing
+import os
+import statistics
+import time
+from collections import namedtuple
+
+from balance_spectrum import TELEMETRY_RE
+from latency_trace import BalanceBotStandIn, KeepAliveClient
+
+TIMEOUT = 1.0
+# 1台のロボットのおかしな返事で、全体を止めないように受け止める例外
+# （ValueError / IndexError: 壊れたステータス行、LimitOverrunError: 長すぎるヘッダー）
+ROBOT_ERRORS = (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError, ValueError, IndexError)
+MOTIONS = ('forward', 'backward', 'left', 'right', 'stop')
+# balance ロボットでの motion の代わり（前後, 旋回）
+STEER_MOTIONS = {
+    'forward': (0.5, 0.0),
+    'backward': (-0.5, 0.0),
+    'left': (0.0, -0.5),
+    'right': (0.0, 0.5),
+    'stop': (0.0, 0.0),
+}
+
+# 1台分の結果（latency は秒、失敗したら error に理由）
+Result = namedtuple('Result', 'robot status latency body error')
+
+
+class Robot:
+    def __init__(self, name, kind, host, port=80):
+        if kind not in ('rc', 'balance'):
+            raise ValueError(f'unknown robot kind: {kind}')
+        self.name = name
+        self.kind = kind
+        self.host = host
+        self.port = port
+        self.client = KeepAliveClient(host, port)
+
+    @classmethod
+    def parse(cls, spec, index=0):
+        """'rc:192.168.4.1' や 'balance:192.168.5.1:80' から作る"""
+        kind, _, address = spec.partition(':')
+        host, _, port = address.partition(':')
+        return cls(f'{kind}{index}@{host}', kind, host, int(port or 80))
+
+    def motion_path(self, motion):
+        if self.kind == 'rc':
+            return '/' + motion
+        forward, turn = STEER_MOTIONS[motion]
+        return f'/steer?f={forward}&t={turn}'
+
+    async def get(self, path, timeout=TIMEOUT):
+        start = time.perf_counter()
+        try:
+            status, _, body = await asyncio.wait_for(self.client.get(path), timeout)
+        except ROBOT_ERRORS as e:
+            self.client.close()  # 返事が途中なら接続は使えないのでつなぎ直す
+            return Result(self, None, time.perf_counter() - start, b'', type(e).__name__)
+        latency = time.perf_counter() - start
+        return Result(self, status, latency, body, None if status == 200 else f'HTTP {status}')
+
+    async def telemetry(self, timeout=TIMEOUT):
+        """/events から最初の "Angle:x Err:y Out:z" を読む（ESP32 の SSE は1台につき1接続だけ）"""
+        if self.kind != 'balance':
+            return None
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), timeout)
+        try:
+            writer.write(f'GET /events HTTP/1.1\r\nHost: {self.host}\r\n\r\n'.encode())
+
+            async def first_line():
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        raise ConnectionError('event stream closed')
+                    match = TELEMETRY_RE.search(line.decode('utf-8', 'replace'))
+                    if match:
+                        angle, err, out = match.groups()
+                        return {'angle': float(angle), 'err': float(err), 'out': int(out)}
+
+            return await asyncio.wait_for(first_line(), timeout)
+        finally:
+            writer.close()
+
+    def close(self):
+        self.client.close()
+
+
+class Fleet:
+    """全台に同じコマンドを同時に送る
+
+    各ロボットの get() をまとめて gather するので、どのリクエストも最初の await より前に
+    書き込まれ、ほぼ同時にロボットへ届く。遅い・応答しないロボットは timeout で切り離す。
+    """
+
+    def __init__(self, robots, timeout=TIMEOUT):
+        self.robots = list(robots)
+        self.timeout = timeout
+
+    async def connect(self):
+        """全台と先に接続しておく（最初のコマンドに接続時間が乗らないように）"""
+        async def connect(robot):
+            try:
+                await asyncio.wait_for(robot.client.connect(), self.timeout)
+            except (OSError, asyncio.TimeoutError):
+                pass
+        await asyncio.gather(*(connect(robot) for robot in self.robots))
+
+    async def broadcast(self, path_for, robots=None):
+        """path_for(robot) のパスを全台へ送り、Result のリストを返す（None のロボットは飛ばす）
+
+        get() が受け止めなかった例外も、そのロボットの Result の error にする。
+        """
+        targets = [(robot, path) for robot in (robots or self.robots)
+                   if (path := path_for(robot)) is not None]
+        results = await asyncio.gather(*(robot.get(path, self.timeout) for robot, path in targets),
+                                       return_exceptions=True)
+        return [r if isinstance(r, Result) else Result(robot, None, 0.0, b'', type(r).__name__)
+                for (robot, _), r in zip(targets, results)]
+
+    async def motion(self, motion):
+        return await self.broadcast(lambda robot: robot.motion_path(motion))
+
+    async def steer(self, forward, turn):
+        return await self.broadcast(
+            lambda robot: f'/steer?f={forward}&t={turn}' if robot.kind == 'balance' else None)
+
+    async def cmd(self, command):
+        return await self.broadcast(
+            lambda robot: f'/cmd?c={command}' if robot.kind == 'balance' else None)
+
+    async def health(self):
+        return await self.broadcast(lambda robot: '/')
+
+    async def telemetry(self):
+        async def read(robot):
+            try:
+                return robot, await robot.telemetry(self.timeout), None
+            except ROBOT_ERRORS as e:
+                return robot, None, type(e).__name__
+        return await asyncio.gather(*(read(robot) for robot in self.robots))
+
+    def close(self):
+        for robot in self.robots:
+            robot.close()
+
+
+def format_results(results):
+    lines = []
+    for r in results:
+        state = 'OK' if r.error is None else f'FAIL ({r.error})'
+        body = r.body[:40].decode('utf-8', 'replace').split('\n')[0] if r.error is None else ''
+        lines.append(f'  {r.robot.name:<28} {state:<18} {r.latency * 1000:7.2f} ms  {body}')
+    ok = [r.latency for r in results if r.error is None]
+    if ok:
+        lines.append(f'  {len(ok)}/{len(results)} ok, median {statistics.median(ok) * 1000:.2f} ms, '
+                     f'slowest {max(ok) * 1000:.2f} ms')
+    return '\n'.join(lines)
+
+
+# ========== 代役でのテスト ==========
+
+class DelayedLink:
+    """Wi-Fi の代わりに、片道 delay 秒だけ遅らせて中継する TCP プロキシ"""
+
+    def __init__(self, target_port, delay):
+        self.target_port = target_port
+        self.delay = delay
+
+    async def handle(self, client_reader, client_writer):
+        try:
+            server_reader, server_writer = await asyncio.open_connection('127.0.0.1', self.target_port)
+        except OSError:
+            client_writer.close()
+            return
+
+        async def pipe(reader, writer):
+            try:
+                while data := await reader.read(65536):
+                    await asyncio.sleep(self.delay)
+                    writer.write(data)
+                    await writer.drain()
+            except ConnectionError:
+                pass
+            finally:
+                writer.close()
+
+        await asyncio.gather(pipe(client_reader, server_writer), pipe(server_reader, client_writer))
+
+
+async def start_stand_ins(count, delay):
+    """rc_server.py と倒立振子の代役を交互に count 台起動し、([(name, kind, port)], 後片付け) を返す"""
+    os.environ.setdefault('GPIO_SIM', '1')
+    import rc_server
+
+    servers, tasks, specs, queues = [], [], [], []
+    for i in range(count):
+        if i % 2 == 0:
+            queue = rc_server.CommandQueue(rc_server.MOTIONS)
+            tasks.append(asyncio.create_task(queue.run()))
+            queues.append(queue)
+            handler, kind = rc_server.RCServer(queue, b'<html></html>').handle, 'rc'
+        else:
+            bot = BalanceBotStandIn(angle=i * 0.1)
+            tasks.append(asyncio.create_task(bot.control_loop()))
+            handler, kind = bot.handle, 'balance'
+        server = await asyncio.start_server(handler, '127.0.0.1', 0)
+        link = await asyncio.start_server(
+            DelayedLink(server.sockets[0].getsockname()[1], delay).handle, '127.0.0.1', 0)
+        servers += [server, link]
+        specs.append((f'{kind}{i}', kind, link.sockets[0].getsockname()[1]))
+
+    async def shutdown():
+        await asyncio.sleep(delay * 2 + 0.05)  # 中継中のデータと接続が閉じるのを待つ
+        for task in tasks:
+            task.cancel()
+        for server in servers:
+            server.close()
+        for queue in queues:
+            queue.executor.shutdown()
+
+    return specs, shutdown
+
+
+def serve_stand_ins(count, delay, conn):
+    """子プロセスの中身: 代役を起動してポートを conn で返し、conn に何か届くまで動かす"""
+    async def run():
+        specs, shutdown = await start_stand_ins(count, delay)
+        conn.send(specs)
+        await asyncio.get_running_loop().run_in_executor(None, conn.recv)
+        await shutdown()
+
+    with contextlib.redirect_stdout(io.StringIO()):  # motor_control.py の print を捨てる
+        asyncio.run(run())
+
+
+async def spawn_stand_ins(count, delay):
+    """代役を別プロセスで起動し、(robots, 後片付け) を返す
+
+    同じイベントループで動かすと、代役の処理時間が測っている側の遅延に混ざり、
+    台数が増えるほど遅く見えてしまう。
+    """
+    conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.get_context('spawn').Process(
+        target=serve_stand_ins, args=(count, delay, child_conn), daemon=True)
+    process.start()
+    loop = asyncio.get_running_loop()
+    specs = await loop.run_in_executor(None, conn.recv)
+    robots = [Robot(name, kind, '127.0.0.1', port) for name, kind, port in specs]
+
+    async def shutdown():
+        for robot in robots:
+            robot.close()
+        conn.send('stop')
+        await loop.run_in_executor(None, process.join)
+
+    return robots, shutdown
+
+
+async def measure_fleet(n, rounds, delay):
+    robots, shutdown = await spawn_stand_ins(n, delay)
+    fleet = Fleet(robots)
+    await fleet.connect()
+    per_robot, broadcast = [], []
+    for i in range(rounds):
+        start = time.perf_counter()
+        results = await fleet.motion(MOTIONS[i % len(MOTIONS)])
+        broadcast.append(time.perf_counter() - start)
+        per_robot += [r.latency for r in results if r.error is None]
+    # 比較用: 1台ずつ順番に送ったとき
+    start = time.perf_counter()
+    for robot in robots:
+        await robot.get(robot.motion_path('stop'))
+    sequential = time.perf_counter() - start
+    health = await fleet.health()
+    telemetry = await fleet.telemetry()
+    await shutdown()
+
+    per_robot.sort()
+    readings = sum(1 for _, t, _ in telemetry if t)
+    failed = sum(1 for r in health if r.error)
+    return (f'{n:>6}  {statistics.median(per_robot) * 1000:10.2f} ms  '
+            f'{per_robot[int(len(per_robot) * 0.99)] * 1000:5.2f} ms  '
+            f'{statistics.median(broadcast) * 1000:6.2f} ms  {sequential * 1000:7.2f} ms  '
+            f'{readings}/{sum(1 for r in robots if r.kind == "balance")}'
+            + (f'  ({failed} unhealthy)' if failed else ''))
+
+
+async def demo(sizes, rounds, delay):
+    print(f'simulated link: {delay * 1000:.1f} ms each way, {rounds} broadcasts per fleet size')
+    print(f'{"robots":>6}  {"per-robot p50":>13}  {"p99":>8}  {"broadcast":>9}  {"sequential":>10}  telemetry')
+    for n in sizes:
+        print(await measure_fleet(n, rounds, delay), flush=True)
+
+
+async def main(args):
+    fleet = Fleet([Robot.parse(spec, i) for i, spec in enumerate(args.robot)], args.timeout)
+    try:
+        await fleet.connect()
+        if args.action == 'health':
+            print(format_results(await fleet.health()))
+        elif args.action == 'telemetry':
+            for robot, reading, error in await fleet.telemetry():
+                value = reading if reading is not None else error or 'no telemetry (rc)'
+                print(f'  {robot.name:<28} {value}')
+        elif args.action == 'motion':
+            print(format_results(await fleet.motion(args.values[0])))
+        elif args.action == 'steer':
+            print(format_results(await fleet.steer(float(args.values[0]), float(args.values[1]))))
+        elif args.action == 'cmd':
+            print(format_results(await fleet.cmd(args.values[0])))
+    finally:
+        fleet.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Command and monitor several robots at once')
+    parser.add_argument('--robot', action='append', default=[], metavar='KIND:HOST[:PORT]',
+                        help='rc:192.168.4.1 or balance:192.168.5.1 (repeat for each robot)')
+    parser.add_argument('--timeout', type=float, default=TIMEOUT)
+    parser.add_argument('--demo', metavar='SIZES', help='comma-separated fleet sizes to test with stand-ins')
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--delay', type=float, default=0.003, help='simulated one-way link delay (s)')
+    parser.add_argument('action', nargs='?', choices=('health', 'telemetry', 'motion', 'steer', 'cmd'))
+    parser.add_argument('values', nargs='*')
+    args = parser.parse_args()
+
+    if args.demo:
+        asyncio.run(demo([int(n) for n in args.demo.split(',')], args.rounds, args.delay))
+        raise SystemExit(0)
+    if not args.robot or not args.action:
+        parser.error('give --robot ... and an action, or --demo')
+    expected = {'health': 0, 'telemetry': 0, 'motion': 1, 'steer': 2, 'cmd': 1}[args.action]
+    if len(args.values) != expected:
+        parser.error(f'{args.action} takes {expected} value(s)')
+    if args.action == 'motion' and args.values[0] not in MOTIONS:
+        parser.error(f'motion must be one of {", ".join(MOTIONS)}')
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        print('\nStopping...')
@@ -0,0 +1,450 @@
+# Fusion 360 スクリプトをヘッドレスで実行するシミュレーター
+# adsk.core / adsk.fusion の必要な部分だけを真似して、作られた形状を記録する
+# （Fusion 360 なしでスクリプトの動作確認・実行時間の計測・体積の見積もりができる）
+#
+# 使い方:
+#   python3 fusion_sim.py esp32_rc_car/fusion/FloorPlate.py
+#   python3 fusion_sim.py original_car/wheel_spoke/wheel_spoke.py num_spokes=5   # 変数を変えて実行
+#
+#   from fusion_sim import run_script
+#   design = run_script('original_car/chassis/chassis.py')
+#   for comp in design.components:
+#       for ext in comp.extrudes:
+#           print(ext.operation, ext.profile.kind, ext.z0, ext.height)
+#
+# 対応している形状:
+#   XY平面（とそれをオフセットした平面）上のスケッチ、
+#   長方形・線で囲んだ多角形・円（同心円はリングになる）、距離指定の押し出し
+
+import ast
+import math
+import sys
+import types
+from collections import namedtuple
+
+TOLERANCE = 1e-9
+
+NEW_BODY = 'new'
+JOIN = 'join'
+CUT = 'cut'
+INTERSECT = 'intersect'
+
+# 押し出し1回分の記録（単位は Fusion 内部と同じ cm）
+Extrusion = namedtuple('Extrusion', 'operation profile z0 height')
+
+
+class FusionScriptError(RuntimeError):
+    pass
+
+
+# ========== adsk.core ==========
+
+class Point3D:
+    def __init__(self, x, y, z):
+        self.x, self.y, self.z = x, y, z
+
+    @staticmethod
+    def create(x=0.0, y=0.0, z=0.0):
+        return Point3D(x, y, z)
+
+
+class Matrix3D:
+    @staticmethod
+    def create():
+        return Matrix3D()
+
+
+class ValueInput:
+    def __init__(self, value):
+        self.realValue = value
+
+    @staticmethod
+    def createByReal(value):
+        return ValueInput(value)
+
+
+class ObjectCollection(list):
+    @staticmethod
+    def create():
+        return ObjectCollection()
+
+    def add(self, item):
+        self.append(item)
+        return True
+
+    def item(self, index):
+        return self[index]
+
+    @property
+    def count(self):
+        return len(self)
+
+
+class UserInterface:
+    def __init__(self):
+        self.messages = []
+        self.errors = []
+
+    def messageBox(self, text, *args):
+        self.messages.append(text)
+        # スクリプトは例外を except: で受けて messageBox に表示するので、ここで拾う
+        exc = sys.exc_info()[1]
+        if exc is not None:
+            self.errors.append(exc)
+
+
+class Viewport:
+    def fit(self):
+        pass
+
+
+class Application:
+    current = None
+
+    def __init__(self):
+        self.userInterface = UserInterface()
+        self.activeProduct = Design()
+        self.activeViewport = Viewport()
+
+    @staticmethod
+    def get():
+        return Application.current
+
+
+# ========== adsk.fusion ==========
+
+class FeatureOperations:
+    NewBodyFeatureOperation = NEW_BODY
+    JoinFeatureOperation = JOIN
+    CutFeatureOperation = CUT
+    IntersectFeatureOperation = INTERSECT
+
+
+class Design:
+    def __init__(self):
+        self.components = []
+        self.rootComponent = Component(self, 'root')
+
+    @property
+    def allComponents(self):
+        return ObjectCollection(self.components)
+
+
+class Component:
+    def __init__(self, design, name):
+        self.design = design
+        self.name = name
+        self.extrudes = []   # 記録された押し出し（順番通り）
+        self.bRepBodies = ObjectCollection()
+        self.xYConstructionPlane = ConstructionPlane(0.0)
+        self.xZConstructionPlane = ConstructionPlane(None)
+        self.yZConstructionPlane = ConstructionPlane(None)
+        self.sketches = Sketches()
+        self.constructionPlanes = ConstructionPlanes()
+        self.occurrences = Occurrences(design)
+        self.features = types.SimpleNamespace(
+            extrudeFeatures=ExtrudeFeatures(self),
+            combineFeatures=CombineFeatures(self),
+        )
+        design.components.append(self)
+
+
+class Occurrences:
+    def __init__(self, design):
+        self.design = design
+
+    def addNewComponent(self, transform):
+        return types.SimpleNamespace(component=Component(self.design, ''))
+
+
+class ConstructionPlane:
+    """z はXY平面からの高さ。XZ/YZ平面は None（スケッチには対応していない）"""
+
+    def __init__(self, z):
+        self.z = z
+
+
+class ConstructionPlanes:
+    def createInput(self):
+        return _PlaneInput()
+
+    def add(self, plane_input):
+        return ConstructionPlane(plane_input.z)
+
+
+class _PlaneInput:
+    def __init__(self):
+        self.z = None
+
+    def setByOffset(self, plane, offset):
+        if plane.z is None:
+            raise FusionScriptError('only offsets from the XY plane are supported')
+        self.z = plane.z + offset.realValue
+
+
+class Sketches:
+    def add(self, plane):
+        if plane.z is None:
+            raise FusionScriptError('only sketches on XY-parallel planes are supported')
+        return Sketch(plane.z)
+
+
+class Sketch:
+    def __init__(self, z):
+        self.z = z
+        self.lines = []     # ((x1, y1), (x2, y2))
+        self.polygons = []  # 長方形
+        self.circles = []   # ((cx, cy), r)
+        self.sketchCurves = types.SimpleNamespace(
+            sketchLines=SketchLines(self),
+            sketchCircles=SketchCircles(self),
+        )
+        self._profiles = None
+
+    @property
+    def profiles(self):
+        if self._profiles is None:
+            self._profiles = ObjectCollection(find_profiles(self))
+        return self._profiles
+
+
+class SketchLines:
+    def __init__(self, sketch):
+        self.sketch = sketch
+
+    def addTwoPointRectangle(self, p1, p2):
+        x1, x2 = sorted((p1.x, p2.x))
+        y1, y2 = sorted((p1.y, p2.y))
+        self.sketch.polygons.append(((x1, y1), (x2, y1), (x2, y2), (x1, y2)))
+        self.sketch._profiles = None
+
+    def addByTwoPoints(self, p1, p2):
+        self.sketch.lines.append(((p1.x, p1.y), (p2.x, p2.y)))
+        self.sketch._profiles = None
+
+
+class SketchCircles:
+    def __init__(self, sketch):
+        self.sketch = sketch
+
+    def addByCenterRadius(self, center, radius):
+        self.sketch.circles.append(((center.x, center.y), radius))
+        self.sketch._profiles = None
+
+
+class Profile:
+    """スケッチの閉じた領域
+
+    kind: 'polygon'（points）、'circle'（center, radius）、'ring'（center, radius, inner_radius）
+    """
+
+    def __init__(self, kind, z, points=None, center=None, radius=0.0, inner_radius=0.0):
+        self.kind = kind
+        self.z = z
+        self.points = points
+        self.center = center
+        self.radius = radius
+        self.inner_radius = inner_radius
+
+    @property
+    def area(self):
+        if self.kind == 'polygon':
+            return abs(polygon_area(self.points))
+        return math.pi * (self.radius ** 2 - self.inner_radius ** 2)
+
+    @property
+    def perimeter(self):
+        if self.kind == 'polygon':
+            pts = self.points
+            return sum(math.dist(pts[i], pts[(i + 1) % len(pts)]) for i in range(len(pts)))
+        return 2 * math.pi * (self.radius + self.inner_radius)
+
+    def areaProperties(self):
+        return types.SimpleNamespace(area=self.area)
+
+
+class ExtrudeFeatures:
+    def __init__(self, component):
+        self.component = component
+
+    def createInput(self, profile, operation):
+        return ExtrudeInput(profile, operation)
+
+    def add(self, extrude_input):
+        if extrude_input.height is None:
+            raise FusionScriptError('extrude extent was not set')
+        profile = extrude_input.profile
+        z0, height = profile.z, extrude_input.height
+        if height < 0:
+            z0, height = z0 + height, -height
+        record = Extrusion(extrude_input.operation, profile, z0, height)
+        self.component.extrudes.append(record)
+        if extrude_input.operation == NEW_BODY:
+            self.component.bRepBodies.add(record)
+        return record
+
+
+class ExtrudeInput:
+    def __init__(self, profile, operation):
+        self.profile = profile
+        self.operation = operation
+        self.height = None
+
+    def setDistanceExtent(self, isSymmetric, distance):
+        if isSymmetric:
+            raise FusionScriptError('symmetric extents are not supported')
+        self.height = distance.realValue
+
+
+class CombineFeatures:
+    def __init__(self, component):
+        self.component = component
+
+    def createInput(self, target, tools):
+        return types.SimpleNamespace(target=target, tools=tools, operation=JOIN,
+                                     isKeepToolBodies=False)
+
+    def add(self, combine_input):
+        # 押し出しは1つの形として扱うので、ボディの数だけ減らしておく
+        if combine_input.operation != JOIN:
+            raise FusionScriptError('only join combines are supported')
+        if not combine_input.isKeepToolBodies:
+            for tool in combine_input.tools:
+                self.component.bRepBodies.remove(tool)
+
+
+# ========== プロファイルの計算 ==========
+
+def polygon_area(points):
+    """符号付き面積（反時計回りが正）"""
+    s = 0.0
+    for i in range(len(points)):
+        x1, y1 = points[i]
+        x2, y2 = points[(i + 1) % len(points)]
+        s += x1 * y2 - x2 * y1
+    return s / 2
+
+
+def chain_lines(lines):
+    """線分をつないで閉じた多角形のリストにする"""
+    remaining = list(lines)
+    loops = []
+    while remaining:
+        start, end = remaining.pop(0)
+        loop = [start]
+        while math.dist(end, start) > TOLERANCE:
+            for i, (a, b) in enumerate(remaining):
+                if math.dist(a, end) <= TOLERANCE:
+                    loop.append(a)
+                    end = b
+                    break
+                if math.dist(b, end) <= TOLERANCE:
+                    loop.append(b)
+                    end = a
+                    break
+            else:
+                raise FusionScriptError('sketch lines do not form a closed loop')
+            remaining.pop(i)
+        loops.append(tuple(loop))
+    return loops
+
+
+def find_profiles(sketch):
+    profiles = [Profile('polygon', sketch.z, points=pts)
+                for pts in sketch.polygons + chain_lines(sketch.lines)]
+
+    # 同じ中心の円はまとめて、内側から円・リング・リング…にする
+    groups = {}
+    for (cx, cy), r in sketch.circles:
+        groups.setdefault((round(cx, 9), round(cy, 9)), []).append(r)
+    for center, radii in groups.items():
+        inner = 0.0
+        for r in sorted(set(radii)):
+            if inner == 0.0:
+                profiles.append(Profile('circle', sketch.z, center=center, radius=r))
+            else:
+                profiles.append(Profile('ring', sketch.z, center=center, radius=r, inner_radius=inner))
+            inner = r
+    return profiles
+
+
+# ========== 実行 ==========
+
+def install():
+    """adsk モジュールを sys.modules に登録する"""
+    if 'adsk' in sys.modules and getattr(sys.modules['adsk'], 'SIMULATED', False):
+        return
+    adsk = types.ModuleType('adsk')
+    adsk.SIMULATED = True
+    core = types.ModuleType('adsk.core')
+    for obj in (Point3D, Matrix3D, ValueInput, ObjectCollection, Application):
+        setattr(core, obj.__name__, obj)
+    fusion = types.ModuleType('adsk.fusion')
+    fusion.FeatureOperations = FeatureOperations
+    fusion.Design = Design
+    fusion.Component = Component
+    cam = types.ModuleType('adsk.cam')
+    adsk.core, adsk.fusion, adsk.cam = core, fusion, cam
+    sys.modules.update({'adsk': adsk, 'adsk.core': core, 'adsk.fusion': fusion, 'adsk.cam': cam})
+
+
+def load_script(path, params=None):
+    """スクリプトを読み込んで run 関数を返す
+
+    params（{変数名: 値}）を渡すと、スクリプト内のその変数への最初の代入を置き換える。
+    floor_thickness = mm(5) のような代入は mm() の中身だけを置き換える（単位は mm のまま）。
+    """
+    install()
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    if params:
+        override_params(tree, params)
+    module = types.ModuleType('fusion_script_' + str(abs(hash(path))))
+    module.__file__ = path
+    exec(compile(tree, path, 'exec'), module.__dict__)
+    return module.run
+
+
+def override_params(tree, params):
+    remaining = dict(params)
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Assign) and len(node.targets) == 1
+                and isinstance(node.targets[0], ast.Name) and node.targets[0].id in remaining):
+            continue
+        value = ast.Constant(remaining.pop(node.targets[0].id))
+        call = node.value
+        if isinstance(call, ast.Call) and isinstance(call.func, ast.Name) and call.func.id == 'mm':
+            call.args = [value]
+        else:
+            node.value = value
+        ast.fix_missing_locations(node)
+    if remaining:
+        raise FusionScriptError(f'no such parameter in script: {", ".join(remaining)}')
+
+
+def run_script(path_or_run, params=None):
+    """スクリプトを実行して、記録された Design を返す"""
+    run = load_script(path_or_run, params) if isinstance(path_or_run, str) else path_or_run
+    app = Application.current = Application()
+    run(None)
+    if app.userInterface.errors:
+        raise FusionScriptError(app.userInterface.messages[-1]) from app.userInterface.errors[0]
+    design = app.activeProduct
+    design.messages = app.userInterface.messages
+    return design
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('usage: fusion_sim.py SCRIPT.py [NAME=VALUE ...]')
+        sys.exit(1)
+
+    overrides = dict(arg.split('=', 1) for arg in sys.argv[2:])
+    design = run_script(sys.argv[1], {k: float(v) if '.' in v else int(v) for k, v in overrides.items()})
+    for comp in design.components:
+        if not comp.extrudes:
+            continue
+        print(f'Component: {comp.name} ({comp.bRepBodies.count} bodies)')
+        for ext in comp.extrudes:
+            print(f'  {ext.operation:5s} {ext.profile.kind:8s} area={ext.profile.area * 100:8.1f}mm2'
+                  f'  z={ext.z0 * 10:5.1f}mm  h={ext.height * 10:5.1f}mm')
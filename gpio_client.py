@@ -0,0 +1,121 @@
+# gpio_daemon.py のクライアント
+# RPi.GPIO を import しないので、短いスクリプトでもすぐ起動できる
+#
+# 使い方（コマンドライン）:
+#   python3 gpio_client.py motion forward
+#   python3 gpio_client.py write 17 1
+#   python3 gpio_client.py read 4
+#
+# 使い方（スクリプトから）:
+#   from gpio_client import GPIOClient
+#   with GPIOClient() as gpio:
+#       gpio.setup_output(17)
+#       gpio.output(17, 1)
+
+import os
+import socket
+import struct
+import sys
+
+SOCKET_PATH = os.environ.get('GPIO_DAEMON_SOCK', '/tmp/gpio_daemon.sock')
+
+# ========== プロトコル ==========
+# リクエスト: op(1byte) pin(1byte) value(1byte)
+# レスポンス: status(1byte) value(1byte)
+REQUEST = struct.Struct('BBB')
+RESPONSE = struct.Struct('BB')
+
+OP_SETUP_OUT = 1
+OP_SETUP_IN = 2   # value: 0=プルなし 1=プルダウン 2=プルアップ
+OP_WRITE = 3
+OP_READ = 4
+OP_MOTION = 5     # value: MOTION_NAMES のインデックス
+OP_RELEASE = 6
+
+STATUS_OK = 0
+STATUS_BUSY = 1        # 他のクライアントが使用中
+STATUS_BAD_REQUEST = 2
+STATUS_NOT_SETUP = 3
+
+PULL_OFF = 0
+PULL_DOWN = 1
+PULL_UP = 2
+
+MOTION_NAMES = ('forward', 'backward', 'left', 'right', 'stop')
+
+STATUS_MESSAGES = {
+    STATUS_BUSY: 'pin is in use by another client',
+    STATUS_BAD_REQUEST: 'bad request',
+    STATUS_NOT_SETUP: 'pin has not been set up by this client',
+}
+
+
+class GPIOError(RuntimeError):
+    pass
+
+
+class GPIOClient:
+    def __init__(self, path=SOCKET_PATH):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+
+    def request(self, op, pin=0, value=0):
+        self.sock.sendall(REQUEST.pack(op, pin, value))
+        data = b''
+        while len(data) < RESPONSE.size:
+            chunk = self.sock.recv(RESPONSE.size - len(data))
+            if not chunk:
+                raise GPIOError('daemon closed the connection')
+            data += chunk
+        status, result = RESPONSE.unpack(data)
+        if status != STATUS_OK:
+            raise GPIOError(f'GPIO {pin}: {STATUS_MESSAGES.get(status, status)}')
+        return result
+
+    def setup_output(self, pin):
+        self.request(OP_SETUP_OUT, pin)
+
+    def setup_input(self, pin, pull=PULL_OFF):
+        self.request(OP_SETUP_IN, pin, pull)
+
+    def output(self, pin, value):
+        self.request(OP_WRITE, pin, int(bool(value)))
+
+    def input(self, pin):
+        return self.request(OP_READ, pin)
+
+    def motion(self, name):
+        self.request(OP_MOTION, 0, MOTION_NAMES.index(name))
+
+    def release(self, pin):
+        self.request(OP_RELEASE, pin)
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print('usage: gpio_client.py motion NAME | write PIN VALUE | read PIN')
+        sys.exit(1)
+
+    cmd = sys.argv[1]
+    with GPIOClient() as gpio:
+        if cmd == 'motion':
+            gpio.motion(sys.argv[2])
+        elif cmd == 'write':
+            # 接続を閉じるとピンの占有は解除されるが、出力値はそのまま残る
+            gpio.setup_output(int(sys.argv[2]))
+            gpio.output(int(sys.argv[2]), int(sys.argv[3]))
+        elif cmd == 'read':
+            gpio.setup_input(int(sys.argv[2]))
+            print(gpio.input(int(sys.argv[2])))
+        else:
+            print('Unknown command')
+            sys.exit(1)
@@ -0,0 +1,198 @@
+# GPIO デーモン
+# GPIO の初期化を1回だけ行い、Unixドメインソケット経由でピン操作を受け付ける
+# 毎回 RPi.GPIO を import・setup・cleanup する必要がなくなり、複数のスクリプトで
+# 同じピンを取り合うこともなくなる（先に使ったクライアントが占有する）
+#
+# 使い方:
+#   python3 gpio_daemon.py               # 起動しっぱなしにする
+#   GPIO_SIM=1 python3 gpio_daemon.py    # 実機なしで試す
+#   python3 gpio_client.py motion forward
+#   GPIO_DAEMON=1 python3 motor_control.py   # motor_control.py / pir_led.py もデーモン経由にする（daemon_gpio.py）
+
+import asyncio
+import os
+import signal
+import socket
+import sys
+
+# デーモン自身は本物（または GPIO_SIM）の GPIO を使う（daemon_gpio.py だと自分につなぎに行く）
+os.environ.pop('GPIO_DAEMON', None)
+
+from gpio_client import (
+    SOCKET_PATH, REQUEST, RESPONSE, MOTION_NAMES,
+    OP_SETUP_OUT, OP_SETUP_IN, OP_WRITE, OP_READ, OP_MOTION, OP_RELEASE,
+    STATUS_OK, STATUS_BUSY, STATUS_BAD_REQUEST, STATUS_NOT_SETUP,
+    PULL_OFF, PULL_DOWN, PULL_UP,
+)
+from motor_control import GPIO, MOTIONS, IN1, IN2, IN3, IN4
+from state_bus import StateBus, SLOT_MOTOR
+
+MOTOR_PINS = (IN1, IN2, IN3, IN4)
+PULLS = {PULL_OFF: GPIO.PUD_OFF, PULL_DOWN: GPIO.PUD_DOWN, PULL_UP: GPIO.PUD_UP}
+
+
+class PinTable:
+    """どのピンをどのクライアントが使っているかを管理する"""
+
+    def __init__(self, bus=None):
+        self.owners = {}      # 出力ピン → クライアントID
+        self.inputs = {}      # 入力ピン → 設定したクライアントIDの集合（設定済みなら誰でも読める）
+        self.bus = bus        # モーターの動作を他のプロセスに知らせる
+        self.motion_count = 0
+
+    def handle(self, client, op, pin, value):
+        """リクエストを1つ処理して (status, value) を返す"""
+        owner = self.owners.get(pin)
+
+        if op == OP_SETUP_OUT:
+            if owner not in (None, client) or pin in self.inputs or pin in MOTOR_PINS:
+                return STATUS_BUSY, 0
+            if owner is None:
+                GPIO.setup(pin, GPIO.OUT)
+                self.owners[pin] = client
+            return STATUS_OK, 0
+
+        if op == OP_SETUP_IN:
+            if value not in PULLS:
+                return STATUS_BAD_REQUEST, 0
+            if owner is not None or pin in MOTOR_PINS:
+                return STATUS_BUSY, 0
+            if pin not in self.inputs:
+                GPIO.setup(pin, GPIO.IN, pull_up_down=PULLS[value])
+                self.inputs[pin] = set()
+            self.inputs[pin].add(client)
+            return STATUS_OK, 0
+
+        if op == OP_WRITE:
+            if owner != client:
+                return (STATUS_NOT_SETUP if owner is None else STATUS_BUSY), 0
+            GPIO.output(pin, GPIO.HIGH if value else GPIO.LOW)
+            return STATUS_OK, 0
+
+        if op == OP_READ:
+            if pin not in self.inputs:
+                return STATUS_NOT_SETUP, 0
+            return STATUS_OK, GPIO.input(pin)
+
+        if op == OP_MOTION:
+            if value >= len(MOTION_NAMES):
+                return STATUS_BAD_REQUEST, 0
+            if any(self.owners.get(p) not in (None, client) for p in MOTOR_PINS):
+                return STATUS_BUSY, 0
+            for p in MOTOR_PINS:
+                self.owners[p] = client
+            MOTIONS[MOTION_NAMES[value]]()
+            self.motion_count += 1
+            if self.bus is not None:
+                self.bus.write(SLOT_MOTOR, counter=self.motion_count, value=value)
+            return STATUS_OK, 0
+
+        if op == OP_RELEASE:
+            if client in self.inputs.get(pin, ()):
+                self.release_input(client, pin)
+                return STATUS_OK, 0
+            if owner != client:
+                return STATUS_NOT_SETUP, 0
+            self.release_pin(pin)
+            return STATUS_OK, 0
+
+        return STATUS_BAD_REQUEST, 0
+
+    def release_pin(self, pin):
+        del self.owners[pin]
+        if pin not in MOTOR_PINS:
+            GPIO.cleanup(pin)
+
+    def release_input(self, client, pin):
+        """入力ピンの設定を1つ外す（誰も使わなくなったら出力に設定できるようにする）"""
+        clients = self.inputs[pin]
+        clients.discard(client)
+        if not clients:
+            del self.inputs[pin]
+            GPIO.cleanup(pin)
+
+    def release_client(self, client):
+        """切断されたクライアントの占有を解除する（出力値はそのまま）"""
+        for pin in [p for p, c in self.owners.items() if c == client]:
+            del self.owners[pin]
+        for pin in [p for p, clients in self.inputs.items() if client in clients]:
+            self.release_input(client, pin)
+
+
+class GPIODaemon:
+    def __init__(self, bus=None):
+        self.pins = PinTable(bus)
+        self.next_client = 0
+        self.writers = set()
+
+    async def handle(self, reader, writer):
+        client = self.next_client
+        self.next_client += 1
+        self.writers.add(writer)
+        try:
+            while True:
+                try:
+                    data = await reader.readexactly(REQUEST.size)
+                except asyncio.IncompleteReadError:
+                    break
+                # GPIO操作は数マイクロ秒で終わるので、ループ内で直接行う
+                # （1つずつ順番に処理されるので、ピンの取り合いも起きない）
+                status, value = self.pins.handle(client, *REQUEST.unpack(data))
+                writer.write(RESPONSE.pack(status, value))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.writers.discard(writer)
+            self.pins.release_client(client)
+            writer.close()
+
+    async def close(self):
+        """つながっているクライアントを切り、各 handle() が終わるのを待つ"""
+        for writer in list(self.writers):
+            writer.close()
+        while self.writers:
+            await asyncio.sleep(0.01)
+
+
+def daemon_running(path):
+    """ソケットにつながれば、別のデーモンが動いている"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            return False
+    return True
+
+
+async def main(path):
+    if os.path.exists(path):
+        os.unlink(path)  # 前回異常終了したときの残り（daemon_running() で確認済み）
+    daemon = GPIODaemon(StateBus())
+    server = await asyncio.start_unix_server(daemon.handle, path)
+    # kill / systemctl stop（SIGTERM）でも Ctrl-C と同じく止める（下の finally でモーターを止める）
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopped.set)
+    print(f'GPIO daemon started! {path}')
+    await stopped.wait()
+    # wait_closed() はつながっているクライアントが切れるまで待つことがあるので呼ばない
+    server.close()
+    await daemon.close()
+    print('\nStopping...')
+
+
+if __name__ == '__main__':
+    if daemon_running(SOCKET_PATH):
+        # ここで終わらないと、動いているデーモンのソケットを消して GPIO を取り合ってしまう
+        sys.exit(f'GPIO daemon is already running on {SOCKET_PATH}')
+    try:
+        asyncio.run(main(SOCKET_PATH))
+    except KeyboardInterrupt:
+        print('\nStopping...')
+    finally:
+        MOTIONS['stop']()
+        GPIO.cleanup()
+        if os.path.exists(SOCKET_PATH):
+            os.unlink(SOCKET_PATH)
@@ -29,6 +29,7 @@
 #include <Wire.h>
 #include <WiFi.h>
 #include <WebServer.h>
+#include "motor_lut.h"  // 不感帯補正テーブル（motor_char.py で生成）
 
 // ========== Wi-Fi AP設定 ==========
 const char* AP_SSID = "BalanceBot";
@@ -67,6 +68,12 @@ float rcTurn = 0.0;      // 旋回 -1.0 ~ 1.0 (右が正)
 float RC_ANGLE_MAX = 3.0;   // 前後操作で傾ける最大角度
 float RC_TURN_SPEED = 80.0; // 旋回時の左右モーター速度差
 
+// ========== 遅延の計測（latency_trace.py） ==========
+// /steer?id= を受けた時刻と、次の制御周期で setMotors() した時刻を "TRACE ..." で送る
+String traceId = "";
+unsigned long traceRecv = 0;
+unsigned long traceParse = 0;
+
 // ========== センサー・制御変数 ==========
 float angle = 0;
 float prevAngle = 0;
@@ -200,7 +207,12 @@ var cx=140,cy=140,maxR=105;
 var touching=false,tid=null;
 var curFwd=0,curTurn=0;
 
+var col=new URLSearchParams(location.search).get('collector');
+var tseq=Math.floor(Math.random()*1e9),inT=null;
+function beacon(o){o.src='balance_rc';navigator.sendBeacon('http://'+col+'/trace',JSON.stringify(o));}
+
 function pos(px,py){
+  inT=performance.now();
   var dx=px-cx,dy=py-cy;
   var dist=Math.sqrt(dx*dx+dy*dy);
   if(dist>maxR){dx=dx/dist*maxR;dy=dy/dist*maxR;}
@@ -214,11 +226,18 @@ function pos(px,py){
 
 function reset(){
   stick.style.left='105px';stick.style.top='105px';
-  curFwd=0;curTurn=0;
+  curFwd=0;curTurn=0;inT=performance.now();
   sendRC();
 }
 
-function sendRC(){fetch('/steer?f='+curFwd+'&t='+curTurn);}
+function sendRC(){
+  var u='/steer?f='+curFwd+'&t='+curTurn;
+  if(!col){fetch(u);return;}
+  var id=++tseq,i=inT,s=performance.now();inT=null;
+  fetch(u+'&id='+id).then(function(r){
+    beacon({id:id,input:i,send:s,done:performance.now(),device:r.headers.get('X-Trace')});
+  });
+}
 
 function getXY(e){
   var r=pad.getBoundingClientRect();
@@ -252,7 +271,10 @@ document.addEventListener('mouseup',function(){
 });
 
 var es=new EventSource('/events');
-es.onmessage=function(e){document.getElementById('status').textContent=e.data;};
+es.onmessage=function(e){
+  if(e.data.indexOf('TRACE')==0){if(col)beacon({event:e.data});return;}
+  document.getElementById('status').textContent=e.data;
+};
 </script>
 </body>
 </html>
@@ -314,11 +336,32 @@ void handleCmd() {
 }
 
 void handleSteer() {
+  unsigned long recv = micros();
   if (server.hasArg("f")) rcForward = constrain(server.arg("f").toFloat(), -1.0, 1.0);
   if (server.hasArg("t")) rcTurn = constrain(server.arg("t").toFloat(), -1.0, 1.0);
+  if (server.hasArg("id")) {
+    if (traceId.length() > 0) {
+      // 前の /steer は setMotors() される前に上書きされた
+      sendTrace("act=-");
+    }
+    traceId = server.arg("id");
+    traceRecv = recv;
+    traceParse = micros();
+    server.sendHeader("X-Trace", "id=" + traceId + " recv=" + String(traceRecv)
+                      + " parse=" + String(traceParse) + " reply=" + String(micros()));
+    server.sendHeader("Access-Control-Expose-Headers", "X-Trace");
+  }
   server.send(200, "text/plain", "OK");
 }
 
+void sendTrace(const String &act) {
+  String trace = "TRACE id=" + traceId + " recv=" + String(traceRecv)
+               + " parse=" + String(traceParse) + " " + act;
+  Serial.println(trace);
+  sendSSE(trace);
+  traceId = "";
+}
+
 void handleEvents() {
   sseClient = server.client();
   sseClient.println("HTTP/1.1 200 OK");
@@ -479,6 +522,10 @@ void loop() {
   // ========== モーター駆動 ==========
   setMotors(motorA, motorB);
 
+  if (traceId.length() > 0) {
+    sendTrace("act=" + String(micros()));
+  }
+
   // ========== デバッグ出力 ==========
   String dbg = "Angle:" + String(angle, 1) + " Err:" + String(error, 1) + " Out:" + String(motorPWM);
   Serial.println(dbg);
@@ -489,7 +536,15 @@ void loop() {
   }
 }
 
+// 不感帯補正: 指令値 (-255 ~ 255) をテーブルでデューティに変換
+int compensate(int speed, const uint8_t *fwd, const uint8_t *rev) {
+  return speed >= 0 ? fwd[speed] : -rev[-speed];
+}
+
 void setMotors(int speedA, int speedB) {
+  speedA = compensate(speedA, MOTOR_LUT_A_FWD, MOTOR_LUT_A_REV);
+  speedB = compensate(speedB, MOTOR_LUT_B_FWD, MOTOR_LUT_B_REV);
+
   if (speedA >= 0) {
     ledcWrite(AIN1, speedA);
     ledcWrite(AIN2, 0);
@@ -0,0 +1,121 @@
+/*
+ * モーター特性測定用スケッチ
+ * ESP32 + DRV8833 + 回転センサー（エンコーダ）
+ *
+ * ESP32 Arduino Core 3.x対応版
+ * PCの motor_char.py からシリアルでPWMを指示し、回転数を返す
+ *
+ * 接続:
+ *   GPIO16 → AIN1 (モーターA)
+ *   GPIO17 → AIN2
+ *   GPIO18 → BIN1 (モーターB)
+ *   GPIO19 → BIN2
+ *   3.3V   → STBY (スタンバイ解除)
+ *   GPIO34 ← エンコーダA（スリット円板・ホールセンサーなど）
+ *   GPIO35 ← エンコーダB
+ *
+ * シリアルコマンド (115200bps):
+ *   A<duty>  モーターAのPWM (-255 ~ 255)
+ *   B<duty>  モーターBのPWM (-255 ~ 255)
+ *   R        前回の R からのパルス数と経過時間を返す → "<countA> <countB> <ms>"
+ */
+
+// ピン定義
+#define AIN1 16
+#define AIN2 17
+#define BIN1 18
+#define BIN2 19
+#define ENC_A 34
+#define ENC_B 35
+
+// PWM設定
+#define PWM_FREQ 1000      // 1kHz（03_inverted_pendulum と同じ）
+#define PWM_RESOLUTION 8   // 8bit (0-255)
+
+volatile unsigned long countA = 0;
+volatile unsigned long countB = 0;
+unsigned long lastReport = 0;
+String inputBuffer = "";
+
+void IRAM_ATTR onEncoderA() { countA++; }
+void IRAM_ATTR onEncoderB() { countB++; }
+
+void setup() {
+  Serial.begin(115200);
+
+  ledcAttach(AIN1, PWM_FREQ, PWM_RESOLUTION);
+  ledcAttach(AIN2, PWM_FREQ, PWM_RESOLUTION);
+  ledcAttach(BIN1, PWM_FREQ, PWM_RESOLUTION);
+  ledcAttach(BIN2, PWM_FREQ, PWM_RESOLUTION);
+  stopMotors();
+
+  pinMode(ENC_A, INPUT);
+  pinMode(ENC_B, INPUT);
+  attachInterrupt(digitalPinToInterrupt(ENC_A), onEncoderA, RISING);
+  attachInterrupt(digitalPinToInterrupt(ENC_B), onEncoderB, RISING);
+
+  lastReport = millis();
+  Serial.println("Motor Sweep Ready!");
+}
+
+void loop() {
+  while (Serial.available()) {
+    char c = Serial.read();
+    if (c == '\n' || c == '\r') {
+      processCommand(inputBuffer);
+      inputBuffer = "";
+    } else {
+      inputBuffer += c;
+    }
+  }
+}
+
+void processCommand(String cmd) {
+  cmd.trim();
+  if (cmd.length() == 0) return;
+
+  char type = cmd.charAt(0);
+  int duty = constrain(cmd.substring(1).toInt(), -255, 255);
+
+  switch (type) {
+    case 'A': setMotor(AIN1, AIN2, duty); break;
+    case 'B': setMotor(BIN1, BIN2, duty); break;
+    case 'R': {
+      noInterrupts();
+      unsigned long a = countA;
+      unsigned long b = countB;
+      countA = 0;
+      countB = 0;
+      interrupts();
+      unsigned long now = millis();
+      Serial.print(a); Serial.print(' ');
+      Serial.print(b); Serial.print(' ');
+      Serial.println(now - lastReport);
+      lastReport = now;
+      break;
+    }
+    default:
+      Serial.println("Unknown command");
+  }
+}
+
+/**
+ * モーター1つの速度を設定
+ * duty: -255 ~ 255 (負で逆転)
+ */
+void setMotor(int pin1, int pin2, int duty) {
+  if (duty >= 0) {
+    ledcWrite(pin1, duty);
+    ledcWrite(pin2, 0);
+  } else {
+    ledcWrite(pin1, 0);
+    ledcWrite(pin2, -duty);
+  }
+}
+
+void stopMotors() {
+  ledcWrite(AIN1, 0);
+  ledcWrite(AIN2, 0);
+  ledcWrite(BIN1, 0);
+  ledcWrite(BIN2, 0);
+}
@@ -0,0 +1,503 @@
+# 操作してからモーターが動くまでの遅延を区間ごとに計測する
+#
+# コマンドに id を付けて送り、各所で時刻を記録する:
+#   input   … ボタン・ジョイスティックを操作した（ブラウザ / このスクリプト）
+#   send    … リクエストを送った
+#   recv    … ロボットがリクエストを受け取った（ロボットの時計）
+#   parse   … パラメータを読み終えた
+#   act     … digitalWrite / setMotors が終わった
+# ロボットの時刻は X-Trace ヘッダー、または /events の "TRACE id=..." で届く。
+# 時計が違うので、行き（ネットワーク）は往復時間からロボット内の時間を引いた半分で見積もる。
+#
+# 使い方:
+#   python3 latency_trace.py --demo                     # rc_server.py と倒立振子の代役をローカルで動かして測る
+#   python3 latency_trace.py --drive rc 192.168.4.1     # ESP32 RCカーに自動でコマンドを送って測る
+#   python3 latency_trace.py --drive balance 192.168.4.1
+#   python3 latency_trace.py --collect                  # ブラウザからの報告を集める（ポート9000）
+#     → http://192.168.4.1/rc?collector=<PCのIP>:9000 や controller.html?collector=<PCのIP>:9000 を開く
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+COLLECTOR_PORT = 9000
+STEER_INTERVAL = 0.1     # /rc ページの sendRC() の間隔（setInterval(sendRC, 100)）
+CONTROL_PERIOD = 0.01    # 03_inverted_pendulum.ino の CONTROL_PERIOD_MS
+SSE_INTERVAL = 0.1
+
+PENDING_TIMEOUT = 10.0   # これだけ待ってもそろわない記録は、届かなかったものとして捨てる（秒）
+
+STAGES = ('input→send', 'send→recv', 'recv→parse', 'parse→act', 'round trip', 'input→act')
+
+
+def micros():
+    return time.monotonic_ns() // 1000
+
+
+def parse_trace(text):
+    """'id=17 recv=120 parse=130 act=200' を {'id': 17, 'recv': 120, ...} にする（'-' は None）"""
+    fields = {}
+    for item in text.replace('TRACE', '').split():
+        key, _, value = item.partition('=')
+        if value:
+            fields[key] = None if value == '-' else int(value)
+    return fields
+
+
+class LatencyHistogram:
+    """1µs〜10s を対数で区切ったヒストグラム（1桁を20区間）"""
+
+    EDGES = np.geomspace(1, 1e7, 141)
+
+    def __init__(self):
+        self.counts = np.zeros(len(self.EDGES) + 1, np.int64)
+        self.max = 0
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def add(self, us):
+        self.counts[np.searchsorted(self.EDGES, max(us, 0), side='right')] += 1
+        self.max = max(self.max, us)
+
+    def percentile(self, p):
+        """p%点（マイクロ秒、区間の上端）"""
+        if self.total == 0:
+            return 0.0
+        i = int(np.searchsorted(np.cumsum(self.counts), self.total * p / 100))
+        return float(min(self.EDGES[min(i, len(self.EDGES) - 1)], self.max))
+
+    def bars(self, width=40):
+        """1/4桁ごとにまとめた棒グラフ"""
+        groups = self.counts[1:-1].reshape(-1, 5).sum(axis=1)
+        nonzero = np.flatnonzero(groups)
+        if len(nonzero) == 0:
+            return []
+        top = groups.max()
+        return [f'    {self.EDGES[i * 5] / 1000:9.3f}ms |{"#" * max(1, round(groups[i] / top * width))} {groups[i]}'
+                for i in range(nonzero[0], nonzero[-1] + 1) if groups[i]]
+
+
+class TraceCollector:
+    """id ごとに時刻を集め、そろったら区間ごとのヒストグラムに入れる
+
+    記録は (source, id) ごとにまとめる。クライアント側の時刻はミリ秒（ブラウザの
+    performance.now()）でもマイクロ秒でもよく、scale で合わせる。
+    sendBeacon や TRACE 行が届かなかった記録は timeout 秒で捨てて incomplete に数える
+    （--collect で何時間も動かしてもメモリが増え続けないように）。
+    """
+
+    def __init__(self, timeout=PENDING_TIMEOUT, clock=time.monotonic):
+        self.timeout = timeout
+        self.clock = clock
+        self.pending = {}    # (source, id) → 時刻（最初に届いた順に並ぶ）
+        self.histograms = {}
+        self.completed = {}
+        self.dropped = {}    # ロボットに届いたが、次のコマンドに上書きされて動作しなかった
+        self.incomplete = {}  # timeout までにそろわなかった
+
+    def add(self, source, record, scale=1):
+        """record: {'id', 'input', 'send', 'done', 'recv', 'parse', 'act', 'reply'} の一部"""
+        self.expire()
+        key = (source, record['id'])
+        entry = self.pending.setdefault(key, {'seen': self.clock()})
+        for name in ('input', 'send', 'done'):
+            if record.get(name) is not None:
+                entry[name] = record[name] * scale
+        for name in ('recv', 'parse', 'act', 'reply'):
+            if name in record:
+                entry[name] = record[name]
+        self._try_complete(source, key, entry)
+
+    def add_device(self, source, text):
+        """X-Trace ヘッダーや /events の TRACE 行"""
+        fields = parse_trace(text)
+        if 'id' in fields:
+            self.add(source, fields)
+
+    def expire(self):
+        """timeout を過ぎた記録を古い順に捨てる"""
+        deadline = self.clock() - self.timeout
+        while self.pending:
+            key, entry = next(iter(self.pending.items()))
+            if entry['seen'] > deadline:
+                break
+            del self.pending[key]
+            self.incomplete[key[0]] = self.incomplete.get(key[0], 0) + 1
+
+    def _try_complete(self, source, key, e):
+        if not all(name in e for name in ('send', 'done', 'recv', 'parse', 'reply', 'act')):
+            return
+        del self.pending[key]
+        if e['act'] is None:
+            self.dropped[source] = self.dropped.get(source, 0) + 1
+            return
+        hist = self.histograms.setdefault(source, {stage: LatencyHistogram() for stage in STAGES})
+        round_trip = e['done'] - e['send']
+        uplink = max(0, (round_trip - (e['reply'] - e['recv'])) / 2)
+        stages = {
+            'send→recv': uplink,
+            'recv→parse': e['parse'] - e['recv'],
+            'parse→act': e['act'] - e['parse'],
+            'round trip': round_trip,
+        }
+        if 'input' in e:
+            stages['input→send'] = e['send'] - e['input']
+            stages['input→act'] = stages['input→send'] + uplink + e['act'] - e['recv']
+        for stage, us in stages.items():
+            hist[stage].add(us)
+        self.completed[source] = self.completed.get(source, 0) + 1
+
+    def report(self, show_bars=False):
+        self.expire()
+        lines = []
+        for source, hist in self.histograms.items():
+            waiting = sum(1 for s, _ in self.pending if s == source)
+            lines.append(f'[{source}] {self.completed[source]} commands, '
+                         f'{self.dropped.get(source, 0)} overwritten before actuation, '
+                         f'{self.incomplete.get(source, 0)} incomplete, {waiting} waiting')
+            slowest = max(('input→send', 'send→recv', 'recv→parse', 'parse→act'),
+                          key=lambda stage: hist[stage].percentile(50))
+            for stage in STAGES:
+                h = hist[stage]
+                if h.total == 0:
+                    continue
+                mark = '  <- largest' if stage == slowest else ''
+                lines.append(f'  {stage:<11} p50 {h.percentile(50) / 1000:8.3f}ms  '
+                             f'p90 {h.percentile(90) / 1000:8.3f}ms  p99 {h.percentile(99) / 1000:8.3f}ms  '
+                             f'max {h.max / 1000:8.3f}ms{mark}')
+                if show_bars:
+                    lines += h.bars()
+        return '\n'.join(lines) or 'no complete traces yet'
+
+
+# ========== HTTP（keep-alive） ==========
+
+class KeepAliveClient:
+    """1台のロボットへの keep-alive 接続（GET だけ）
+
+    同時に get() を呼んでも、リクエストと返事が混ざらないように1つずつ送る。
+    """
+
+    def __init__(self, host, port=80):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+        self.lock = asyncio.Lock()
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def get(self, target):
+        """(status, headers, body) を返す。切れていたら1回だけつなぎ直す"""
+        async with self.lock:
+            return await self._get(target)
+
+    async def _get(self, target):
+        for attempt in (0, 1):
+            if self.writer is None or self.writer.is_closing():
+                await self.connect()
+            try:
+                self.writer.write(f'GET {target} HTTP/1.1\r\nHost: {self.host}\r\n\r\n'.encode())
+                head = await self.reader.readuntil(b'\r\n\r\n')
+                break
+            except (ConnectionError, asyncio.IncompleteReadError):
+                self.close()
+                if attempt:
+                    raise
+        lines = head.decode('latin-1').split('\r\n')
+        status = int(lines[0].split()[1])
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+        body = await self.reader.readexactly(int(headers.get('content-length', 0)))
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, headers, body
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+async def follow_events(host, port, on_line):
+    """/events（SSE）を読み続け、data: の中身を on_line に渡す"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f'GET /events HTTP/1.1\r\nHost: {host}\r\n\r\n'.encode())
+        await reader.readuntil(b'\r\n\r\n')
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            if line.startswith(b'data: '):
+                on_line(line[6:].decode('utf-8', 'replace').strip())
+    finally:
+        writer.close()
+
+
+# ========== 自動操作 ==========
+
+async def drive_buttons(collector, client, count, source='rc_car'):
+    """controller.html のボタンを押すのと同じ（押したらすぐ送る）"""
+    for i in range(count):
+        name = random.choice(('forward', 'backward', 'left', 'right', 'stop'))
+        pressed = micros()
+        sent = micros()
+        _, headers, _ = await client.get(f'/{name}?id={i}')
+        collector.add(source, {'id': i, 'input': pressed, 'send': sent, 'done': micros()})
+        collector.add_device(source, headers.get('x-trace', ''))
+        await asyncio.sleep(random.uniform(0.005, 0.03))
+
+
+async def drive_joystick(collector, client, seconds, source='balance_rc'):
+    """/rc ページと同じ: 動かした値は覚えておくだけで、sendRC() が 100ms ごとに送る"""
+    state = {'fwd': 0.0, 'turn': 0.0, 'input': None}
+    stop = asyncio.Event()
+
+    async def move():
+        while not stop.is_set():
+            state['fwd'] = round(random.uniform(-1, 1), 2)
+            state['turn'] = round(random.uniform(-1, 1), 2)
+            state['input'] = micros()
+            await asyncio.sleep(random.uniform(0.02, 0.3))
+
+    async def send_rc():
+        i = 0
+        next_time = time.monotonic()
+        while not stop.is_set():
+            i += 1
+            sent = micros()
+            _, headers, _ = await client.get(f'/steer?f={state["fwd"]}&t={state["turn"]}&id={i}')
+            # 前回送ってから新しく動かしていなければ input はない（同じ値の再送）
+            collector.add(source, {'id': i, 'input': state['input'], 'send': sent, 'done': micros()})
+            collector.add_device(source, headers.get('x-trace', ''))
+            state['input'] = None
+            next_time += STEER_INTERVAL
+            await asyncio.sleep(max(0.0, next_time - time.monotonic()))
+
+    tasks = [asyncio.create_task(move()), asyncio.create_task(send_rc())]
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+
+
+# ========== 代役のサーバー ==========
+
+class BalanceBotStandIn:
+    """03_inverted_pendulum.ino の /steer・/cmd・/events と制御周期だけをまねる
+
+    /steer は値を覚えてすぐ返事をし、次の制御周期で setMotors() したときに
+    /events へ "TRACE id=.. recv=.. parse=.. act=.." を送る（ESP32 と同じ流れ）。
+    """
+
+    def __init__(self, angle=0.0):
+        self.rc_forward = 0.0
+        self.rc_turn = 0.0
+        self.angle = angle
+        self.trace = None
+        self.sse = []
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                received = micros()
+                target = head.split(b' ', 2)[1].decode()
+                path, _, query = target.partition('?')
+                if path == '/events':
+                    writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n'
+                                 b'Cache-Control: no-cache\r\nAccess-Control-Allow-Origin: *\r\n\r\n')
+                    await writer.drain()
+                    self.sse.append(writer)
+                    return
+                args = dict(item.partition('=')[::2] for item in query.split('&') if item)
+                extra = ''
+                if path == '/steer':
+                    self.rc_forward = max(-1.0, min(1.0, float(args.get('f', self.rc_forward))))
+                    self.rc_turn = max(-1.0, min(1.0, float(args.get('t', self.rc_turn))))
+                    if 'id' in args:
+                        if self.trace:
+                            # 前の /steer は setMotors() される前に上書きされた
+                            trace_id, recv, parse = self.trace
+                            self.send_sse(f'TRACE id={trace_id} recv={recv} parse={parse} act=-')
+                        parsed = micros()
+                        self.trace = (args['id'], received, parsed)
+                        extra = (f'X-Trace: id={args["id"]} recv={received} parse={parsed} reply={micros()}\r\n'
+                                 'Access-Control-Expose-Headers: X-Trace\r\n')
+                writer.write(f'HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nContent-Length: 2\r\n'
+                             f'Access-Control-Allow-Origin: *\r\n{extra}\r\nOK'.encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            writer.close()
+
+    def send_sse(self, data):
+        for writer in list(self.sse):
+            if writer.is_closing():
+                self.sse.remove(writer)
+            else:
+                writer.write(f'data: {data}\r\n\r\n'.encode())
+
+    async def control_loop(self):
+        next_time = time.monotonic()
+        last_sse = 0.0
+        while True:
+            next_time += CONTROL_PERIOD
+            await asyncio.sleep(max(0.0, next_time - time.monotonic()))
+            # setMotors(motorA, motorB) の代わり
+            if self.trace:
+                trace_id, received, parsed = self.trace
+                self.trace = None
+                self.send_sse(f'TRACE id={trace_id} recv={received} parse={parsed} act={micros()}')
+            if time.monotonic() - last_sse >= SSE_INTERVAL:
+                self.send_sse(f'Angle:{self.angle:.1f} Err:{self.angle:.1f} Out:{int(self.rc_forward * 100)}')
+                last_sse = time.monotonic()
+
+
+# ========== ブラウザからの報告を受け取る ==========
+
+class CollectorServer:
+    """ページが navigator.sendBeacon() で送る JSON を受け取る
+
+    {"src": "rc", "id": 17, "input": 1234.5, "send": 1240.1, "done": 1262.0, "device": "id=17 recv=..."}
+    {"src": "rc", "event": "TRACE id=17 recv=... act=..."}（/events で届いた TRACE をそのまま転送）
+    ブラウザの時刻はミリ秒なので 1000 倍してマイクロ秒にそろえる。
+    """
+
+    def __init__(self, collector):
+        self.collector = collector
+
+    async def handle(self, reader, writer):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = 0
+            for line in head.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            body = await reader.readexactly(length)
+            if head.startswith(b'GET /summary'):
+                reply = self.collector.report(show_bars=True).encode()
+            else:
+                reply = b'OK'
+                if body:
+                    self.receive(json.loads(body))
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain; charset=utf-8\r\n'
+                         b'Access-Control-Allow-Origin: *\r\nConnection: close\r\n'
+                         + f'Content-Length: {len(reply)}\r\n\r\n'.encode() + reply)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def receive(self, report):
+        source = report.get('src', 'browser')
+        if 'event' in report:
+            self.collector.add_device(source, report['event'])
+            return
+        self.collector.add(source, {'id': report['id'], 'input': report.get('input'),
+                                    'send': report['send'], 'done': report['done']}, scale=1000)
+        if report.get('device'):
+            self.collector.add_device(source, report['device'])
+
+
+async def demo(count, seconds, show_bars):
+    """rc_server.py（GPIO_SIM）と倒立振子の代役をローカルで動かし、両方の経路を測る"""
+    os.environ.setdefault('GPIO_SIM', '1')
+    import rc_server
+
+    collector = TraceCollector()
+    queue = rc_server.CommandQueue(rc_server.MOTIONS)
+    worker = asyncio.create_task(queue.run())
+    rc = await asyncio.start_server(rc_server.RCServer(queue, b'').handle, '127.0.0.1', 0)
+    bot = BalanceBotStandIn()
+    control = asyncio.create_task(bot.control_loop())
+    balance = await asyncio.start_server(bot.handle, '127.0.0.1', 0)
+    rc_port = rc.sockets[0].getsockname()[1]
+    balance_port = balance.sockets[0].getsockname()[1]
+    events = asyncio.create_task(follow_events(
+        '127.0.0.1', balance_port, lambda line: collector.add_device('balance_rc', line)))
+
+    rc_client = KeepAliveClient('127.0.0.1', rc_port)
+    bot_client = KeepAliveClient('127.0.0.1', balance_port)
+    with contextlib.redirect_stdout(io.StringIO()):  # motor_control.py の print を捨てる
+        await asyncio.gather(drive_buttons(collector, rc_client, count),
+                             drive_joystick(collector, bot_client, seconds))
+    await asyncio.sleep(CONTROL_PERIOD * 2)  # 最後の TRACE を待つ
+
+    events.cancel()
+    rc_client.close()
+    bot_client.close()
+    await asyncio.sleep(0.05)  # サーバー側の接続が閉じるのを待つ
+    control.cancel()
+    worker.cancel()
+    rc.close()
+    balance.close()
+    queue.executor.shutdown()
+    print(collector.report(show_bars))
+
+
+async def drive(kind, host, port, count, seconds, show_bars):
+    collector = TraceCollector()
+    client = KeepAliveClient(host, port)
+    if kind == 'rc':
+        await drive_buttons(collector, client, count)
+        await client.get('/stop')
+    else:
+        events = asyncio.create_task(follow_events(
+            host, port, lambda line: collector.add_device('balance_rc', line)))
+        await drive_joystick(collector, client, seconds)
+        await client.get('/steer?f=0&t=0')
+        await asyncio.sleep(0.2)
+        events.cancel()
+    client.close()
+    print(collector.report(show_bars))
+
+
+async def collect(port, interval):
+    collector = TraceCollector()
+    server = await asyncio.start_server(CollectorServer(collector).handle, '0.0.0.0', port)
+    print(f'Collector started! open the page with ?collector=<this PC>:{port}  '
+          f'(summary: http://<this PC>:{port}/summary)')
+    async with server:
+        while True:
+            await asyncio.sleep(interval)
+            print(collector.report(), flush=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='End-to-end command latency tracing')
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--demo', action='store_true', help='trace local stand-in servers')
+    mode.add_argument('--drive', nargs=2, metavar=('rc|balance', 'HOST'), help='send traced commands to a robot')
+    mode.add_argument('--collect', action='store_true', help='collect reports from browser pages')
+    parser.add_argument('--port', type=int, help=f'robot port (default 80) or collector port ({COLLECTOR_PORT})')
+    parser.add_argument('--count', type=int, default=200, help='button presses to send')
+    parser.add_argument('--seconds', type=float, default=10.0, help='how long to move the joystick')
+    parser.add_argument('--interval', type=float, default=10.0, help='collector report interval')
+    parser.add_argument('--histogram', action='store_true', help='print a histogram for each stage')
+    args = parser.parse_args()
+
+    try:
+        if args.demo:
+            asyncio.run(demo(args.count, args.seconds, args.histogram))
+        elif args.drive:
+            kind, host = args.drive
+            if kind not in ('rc', 'balance'):
+                parser.error('--drive takes rc or balance')
+            asyncio.run(drive(kind, host, args.port or 80, args.count, args.seconds, args.histogram))
+        else:
+            asyncio.run(collect(args.port or COLLECTOR_PORT, args.interval))
+    except KeyboardInterrupt:
+        print('\nStopping...')
@@ -0,0 +1,165 @@
+# 人感センサーの検知記録
+# 検知の開始・終了（エッジ）をリングバッファに記録し、定期的にファイルへ追記する
+# メモリ使用量は一定で、何か月分の記録でも NumPy でまとめて集計できる
+#
+# 使い方:
+#   python3 motion_log.py                    # 直近24時間の1時間ごとの在室率
+#   python3 motion_log.py --days 30 --bin 86400
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+LOG_PATH = os.environ.get('MOTION_LOG_PATH',
+                          os.path.join(os.path.dirname(os.path.abspath(__file__)), 'motion.log'))
+
+# ファイル上の1件分: 時刻（UNIX時間ns）と 1=検知開始 / 0=検知終了
+RECORD = np.dtype([('t', '<i8'), ('rising', 'u1')])
+
+
+class MotionRing:
+    """固定サイズのリングバッファ
+
+    flush() でまだ書いていない分をファイルに追記する。
+    バッファが一周しそうになったら自動で flush するので、記録は失われない。
+
+    集計は時刻順に並んでいることを前提にしている（searchsorted）。Pi には RTC がなく、
+    起動時や NTP で時刻が戻ることがあるので、直前の記録（ファイルの最後も含む）より
+    前の時刻はその時刻に揃えて記録する。
+
+    ファイルが検知開始で終わっていたら（前回が検知中のまま落ちた）、終わった時刻は
+    分からないので、同じ時刻に検知終了を書いて閉じる（落ちていた間を在室にしない）。
+    """
+
+    def __init__(self, capacity=4096, path=LOG_PATH, flush_interval=60.0):
+        self.buf = np.zeros(capacity, RECORD)
+        self.capacity = capacity
+        self.path = path
+        self.flush_interval = flush_interval
+        self.count = 0     # これまでに記録した件数
+        self.flushed = 0   # そのうちファイルに書いた件数
+        self.last_flush = time.monotonic()
+        existing = load(path)
+        self.last_t = int(existing['t'][-1]) if len(existing) else None
+        if len(existing) and existing['rising'][-1]:
+            self.record(0, self.last_t)
+            self.flush()
+
+    def record(self, rising, t_ns=None):
+        t = time.time_ns() if t_ns is None else t_ns
+        if self.last_t is not None and t < self.last_t:
+            t = self.last_t  # 時計が戻った
+        self.last_t = t
+        i = self.count % self.capacity
+        self.buf[i] = (t, rising)
+        self.count += 1
+        if self.count - self.flushed >= self.capacity:
+            self.flush()
+
+    def maybe_flush(self):
+        """前回から flush_interval 秒たっていれば flush する"""
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        pending = self.count - self.flushed
+        if pending:
+            with open(self.path, 'ab') as f:
+                f.write(self.recent(pending).tobytes())
+            self.flushed = self.count
+        self.last_flush = time.monotonic()
+
+    def recent(self, n):
+        """最新 n 件を古い順に返す（n はバッファサイズまで）"""
+        n = min(n, self.count, self.capacity)
+        start = (self.count - n) % self.capacity
+        if start + n <= self.capacity:
+            return self.buf[start:start + n].copy()
+        return np.concatenate((self.buf[start:], self.buf[:start + n - self.capacity]))
+
+
+# ========== 集計 ==========
+
+def load(path=LOG_PATH):
+    """ログファイルをメモリマップで開く（全部は読み込まない）"""
+    if not os.path.exists(path) or os.path.getsize(path) < RECORD.itemsize:
+        return np.zeros(0, RECORD)
+    n = os.path.getsize(path) // RECORD.itemsize  # 書き込み途中の端数は無視
+    return np.memmap(path, RECORD, mode='r', shape=(n,))
+
+
+def intervals(events, start_ns, end_ns):
+    """検知中だった区間 (starts, ends) を [start_ns, end_ns) の範囲で返す"""
+    t = events['t']
+    lo = max(np.searchsorted(t, start_ns, 'right') - 1, 0)  # 範囲の前から続いている検知も含める
+    hi = np.searchsorted(t, end_ns, 'left')
+    t = np.asarray(t[lo:hi])
+    rising = np.asarray(events['rising'][lo:hi]).astype(bool)
+    if len(t) == 0:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64)
+
+    # 同じ向きのエッジが続いたら最初の1つだけ残す
+    keep = np.ones(len(t), bool)
+    keep[1:] = rising[1:] != rising[:-1]
+    t, rising = t[keep], rising[keep]
+
+    starts = t[rising]
+    ends = t[~rising]
+    if not rising[0]:
+        ends = ends[1:]
+    if len(ends) < len(starts):  # まだ検知中
+        ends = np.append(ends, end_ns)
+    return np.clip(starts, start_ns, end_ns), np.clip(ends, start_ns, end_ns)
+
+
+def occupancy(start_ns, end_ns, bin_ns, path=LOG_PATH):
+    """区間ごとの在室率（0〜1）を返す: (bin_edges, ratio)"""
+    edges = np.arange(start_ns, end_ns + bin_ns, bin_ns, dtype=np.int64)
+    starts, ends = intervals(load(path), start_ns, edges[-1])
+    if len(starts) == 0:
+        return edges, np.zeros(len(edges) - 1)
+
+    # 各境界までの累積検知時間を求め、差を取る
+    durations = ends - starts
+    cum = np.concatenate(([0], np.cumsum(durations)))
+    idx = np.searchsorted(starts, edges, 'right')   # 境界より前に始まった区間の数
+    prev = np.maximum(idx - 1, 0)
+    partial = np.where(idx > 0, np.minimum(edges - starts[prev], durations[prev]), 0)
+    total = cum[prev] + partial
+    return edges, np.diff(total) / bin_ns
+
+
+def event_rate(start_ns, end_ns, bin_ns, path=LOG_PATH):
+    """区間ごとの検知回数（検知開始の数）を返す: (bin_edges, counts)"""
+    events = load(path)
+    edges = np.arange(start_ns, end_ns + bin_ns, bin_ns, dtype=np.int64)
+    t = events['t']
+    lo = np.searchsorted(t, start_ns, 'left')
+    hi = np.searchsorted(t, edges[-1], 'left')
+    t = np.asarray(t[lo:hi])
+    rising = np.asarray(events['rising'][lo:hi]).astype(bool)
+    # intervals() と同じく、同じ向きのエッジが続いたら最初の1つだけ数える
+    keep = np.ones(len(t), bool)
+    keep[1:] = rising[1:] != rising[:-1]
+    if lo > 0 and len(t):
+        keep[0] = rising[0] != bool(events['rising'][lo - 1])
+    counts, _ = np.histogram(t[rising & keep], bins=edges)
+    return edges, counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Motion occupancy report')
+    parser.add_argument('--days', type=float, default=1.0)
+    parser.add_argument('--bin', type=int, default=3600, help='bin size in seconds')
+    args = parser.parse_args()
+
+    end = time.time_ns()
+    start = end - int(args.days * 86400e9)
+    bin_ns = args.bin * 10**9
+    edges, ratio = occupancy(start, end, bin_ns)
+    _, counts = event_rate(start, end, bin_ns)
+    for t, r, c in zip(edges[:-1], ratio, counts):
+        stamp = time.strftime('%Y-%m-%d %H:%M', time.localtime(t / 1e9))
+        print(f'{stamp}  {r * 100:5.1f}%  {c:4d} events')
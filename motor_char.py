@@ -0,0 +1,229 @@
+# モーターの不感帯・応答特性の測定
+# PWM を少しずつ上げながら回転数を測り、回り始めるデューティ（不感帯）とゲインを求める
+# 結果から 03_inverted_pendulum.ino 用の補正テーブル（motor_lut.h）を作る
+#
+# 使い方:
+#   python3 motor_char.py --port /dev/ttyUSB0      # 04_motor_sweep.ino を書き込んだ ESP32
+#   python3 motor_char.py --sim                     # シミュレーション
+#   python3 motor_char.py --port /dev/ttyUSB0 --header inverted_pendulum/03_inverted_pendulum/motor_lut.h
+#   python3 motor_char.py --identity --header ...   # 補正なしのテーブルに戻す
+
+import argparse
+import datetime
+import time
+
+import numpy as np
+
+try:
+    import serial
+except ImportError:
+    serial = None
+
+MOTORS = ('A', 'B')
+DIRECTIONS = ('fwd', 'rev')  # fwd: デューティが正（AIN1/BIN1 側）
+ENCODER_PPR = 20             # 1回転あたりのパルス数（20スリットの円板）
+MAX_DUTY = 255
+
+
+class SerialLink:
+    """04_motor_sweep.ino とシリアルでやりとりする"""
+
+    def __init__(self, port, baud=115200, ppr=ENCODER_PPR):
+        if serial is None:
+            raise RuntimeError('pyserial is not installed (pip install pyserial)')
+        self.ser = serial.Serial(port, baud, timeout=1)
+        self.ppr = ppr
+        time.sleep(2)  # ポートを開くと ESP32 がリセットされるので待つ
+        self.ser.reset_input_buffer()
+
+    def set_duty(self, motor, duty):
+        self.ser.write(f'{motor}{int(duty)}\n'.encode())
+
+    def read_speed(self):
+        """前回からの平均回転数（rev/s）を (A, B) で返す。向きは分からないので正の値"""
+        self.ser.write(b'R\n')
+        count_a, count_b, ms = (int(v) for v in self.ser.readline().split())
+        seconds = max(ms, 1) / 1000
+        return count_a / self.ppr / seconds, count_b / self.ppr / seconds
+
+    def close(self):
+        for motor in MOTORS:
+            self.set_duty(motor, 0)
+        self.ser.close()
+
+
+class SimMotorLink:
+    """不感帯のあるギアードモーターのシミュレーション
+
+    params: {モーター: {向き: (不感帯デューティ, 回り始めてからの rev/s per duty)}}
+    高速側で少し頭打ちになる（実際の TT モーターに近い）。
+    """
+
+    DEFAULT_PARAMS = {
+        'A': {'fwd': (72, 0.050), 'rev': (80, 0.047)},
+        'B': {'fwd': (88, 0.044), 'rev': (84, 0.046)},
+    }
+
+    def __init__(self, params=None, noise=0.05, seed=0):
+        self.params = params or self.DEFAULT_PARAMS
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+        self.duty = {motor: 0 for motor in MOTORS}
+
+    def set_duty(self, motor, duty):
+        self.duty[motor] = int(duty)
+
+    def speed(self, motor):
+        duty = self.duty[motor]
+        deadband, gain = self.params[motor]['fwd' if duty >= 0 else 'rev']
+        over = abs(duty) - deadband
+        if over <= 0:
+            return 0.0
+        v = gain * over * (1 - 0.2 * over / (MAX_DUTY - deadband))
+        return max(0.0, v + self.rng.normal(0, self.noise))
+
+    def read_speed(self):
+        return self.speed('A'), self.speed('B')
+
+    def close(self):
+        pass
+
+
+# ========== 測定 ==========
+
+def sweep(link, motor, step=5, settle=0.3, window=0.5):
+    """0 から ±255 までデューティを上げて回転数を測る
+
+    返り値: {'fwd': (duty, speed), 'rev': (duty, speed)}（duty・speed とも正の値の配列）
+    """
+    index = MOTORS.index(motor)
+    result = {}
+    for direction, sign in (('fwd', 1), ('rev', -1)):
+        duties = np.arange(0, MAX_DUTY + 1, step)
+        speeds = np.zeros(len(duties))
+        for i, duty in enumerate(duties):
+            link.set_duty(motor, sign * duty)
+            time.sleep(settle)   # 回転が安定するまで待つ
+            link.read_speed()    # カウンタをリセット
+            time.sleep(window)
+            speeds[i] = link.read_speed()[index]
+        link.set_duty(motor, 0)
+        time.sleep(settle)
+        result[direction] = (duties, speeds)
+    return result
+
+
+def fit_deadband(duty, speed):
+    """speed = gain * (duty - deadband)（deadband 以下は 0）に当てはめる
+
+    不感帯の候補をまとめて試し、二乗誤差が最小のものを選ぶ。(deadband, gain) を返す。
+    高速側の頭打ちで不感帯がずれないよう、最高速の半分までの点だけを使う。
+    """
+    duty = np.asarray(duty, float)
+    speed = np.asarray(speed, float)
+    low = speed <= 0.5 * speed.max()
+    duty, speed = duty[low], speed[low]
+    candidates = np.arange(0, MAX_DUTY, 0.5)
+    x = np.clip(duty[None, :] - candidates[:, None], 0, None)
+    xx = (x * x).sum(axis=1)
+    gain = np.divide((x * speed[None, :]).sum(axis=1), xx, out=np.zeros_like(xx), where=xx > 0)
+    sse = ((speed[None, :] - gain[:, None] * x) ** 2).sum(axis=1)
+    best = np.argmin(sse)
+    return float(candidates[best]), float(gain[best])
+
+
+def build_luts(curves, fits):
+    """指令値 0〜255 が、どのモーター・向きでも同じ回転数になるようなデューティ表を作る
+
+    curves: {(モーター, 向き): (duty, speed)}, fits: {(モーター, 向き): (deadband, gain)}
+    指令値 1 でも不感帯のすぐ上のデューティになるので、0 付近でも効くようになる。
+    """
+    # 一番遅いモーターの最高速を 255 に合わせる
+    top_speed = min(np.max(speed) for _, speed in curves.values())
+    command = np.arange(MAX_DUTY + 1)
+    target = command / MAX_DUTY * top_speed
+
+    luts = {}
+    for key, (duty, speed) in curves.items():
+        deadband, _ = fits[key]
+        above = duty > deadband
+        # 測定値を単調増加にして（ノイズ対策）、不感帯の点 (deadband, 0) から始める
+        xp = np.concatenate(([0.0], np.maximum.accumulate(speed[above])))
+        fp = np.concatenate(([deadband], duty[above]))
+        xp = xp + np.arange(len(xp)) * 1e-9  # np.interp 用に狭義単調増加にする
+        lut = np.interp(target, xp, fp)
+        lut[0] = 0
+        luts[key] = np.clip(np.round(lut), 0, MAX_DUTY).astype(np.uint8)
+    return luts
+
+
+def identity_luts():
+    table = np.arange(MAX_DUTY + 1, dtype=np.uint8)
+    return {(motor, direction): table for motor in MOTORS for direction in DIRECTIONS}
+
+
+def write_header(path, luts, fits=None):
+    lines = [
+        '// モーター不感帯補正テーブル（motor_char.py で生成）',
+        f'// 生成日時: {datetime.datetime.now().isoformat(timespec="seconds")}',
+    ]
+    if fits:
+        for (motor, direction), (deadband, gain) in fits.items():
+            lines.append(f'// {motor} {direction}: deadband={deadband:.1f} gain={gain:.4f} rev/s per duty')
+    else:
+        lines.append('// 補正なし（指令値 = デューティ）')
+    lines += ['// 指令値 0〜255 → ledcWrite に渡すデューティ', '', '#pragma once', '']
+    for (motor, direction), lut in luts.items():
+        lines.append(f'const uint8_t MOTOR_LUT_{motor}_{direction.upper()}[256] = {{')
+        for i in range(0, 256, 16):
+            lines.append('  ' + ', '.join(f'{v:3d}' for v in lut[i:i + 16]) + ',')
+        lines.append('};')
+        lines.append('')
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Motor deadband characterization')
+    parser.add_argument('--port', help='serial port of the ESP32 running 04_motor_sweep.ino')
+    parser.add_argument('--sim', action='store_true', help='use the simulated motors')
+    parser.add_argument('--identity', action='store_true', help='write an uncompensated table')
+    parser.add_argument('--step', type=int, default=5)
+    parser.add_argument('--header', help='write the lookup table to this C header')
+    args = parser.parse_args()
+
+    if args.identity:
+        if not args.header:
+            parser.error('--identity needs --header')
+        write_header(args.header, identity_luts())
+        raise SystemExit(0)
+
+    if args.sim:
+        link, timing = SimMotorLink(), dict(settle=0, window=0)
+    elif args.port:
+        link, timing = SerialLink(args.port), {}
+    else:
+        parser.error('give --port or --sim')
+
+    curves, fits = {}, {}
+    try:
+        for motor in MOTORS:
+            print(f'Sweeping motor {motor}...')
+            for direction, curve in sweep(link, motor, args.step, **timing).items():
+                curves[motor, direction] = curve
+                fits[motor, direction] = fit_deadband(*curve)
+    finally:
+        link.close()
+
+    for (motor, direction), (deadband, gain) in fits.items():
+        print(f'  {motor} {direction}: deadband={deadband:5.1f}  gain={gain:.4f} rev/s per duty'
+              f'  max={curves[motor, direction][1].max():.2f} rev/s')
+
+    luts = build_luts(curves, fits)
+    print('command:  ' + ' '.join(f'{c:4d}' for c in (1, 16, 64, 128, 255)))
+    for key, lut in luts.items():
+        print(f'{key[0]} {key[1]}:    ' + ' '.join(f'{lut[c]:4d}' for c in (1, 16, 64, 128, 255)))
+
+    if args.header:
+        write_header(args.header, luts, fits)
+        print(f'Wrote {args.header}')
@@ -1,86 +1,99 @@
-import RPi.GPIO as GPIO
+import os
 from time import sleep
 
+if os.environ.get('GPIO_DAEMON'):
+    import daemon_gpio as GPIO  # gpio_daemon.py 経由（初期化済み・ピンの取り合いなし）
+elif os.environ.get('GPIO_SIM'):
+    import sim_gpio as GPIO  # 実機なしで動かすとき
+else:
+    import RPi.GPIO as GPIO
+
 # ピン番号の設定（BCMモード）
 IN1 = 23
 IN2 = 24
 IN3 = 27
 IN4 = 22
 
-# 初期化
+# 初期化（デーモン経由のときは、デーモンが済ませている）
 GPIO.setmode(GPIO.BCM)
-GPIO.setup(IN1, GPIO.OUT)
-GPIO.setup(IN2, GPIO.OUT)
-GPIO.setup(IN3, GPIO.OUT)
-GPIO.setup(IN4, GPIO.OUT)
+if not hasattr(GPIO, 'motion'):
+    GPIO.setup(IN1, GPIO.OUT)
+    GPIO.setup(IN2, GPIO.OUT)
+    GPIO.setup(IN3, GPIO.OUT)
+    GPIO.setup(IN4, GPIO.OUT)
+
+def drive(name, in1, in2, in3, in4):
+    """4本のピンを切り替える（デーモン経由なら1回のリクエストで4本まとめて）"""
+    if hasattr(GPIO, 'motion'):
+        GPIO.motion(name)
+        return
+    GPIO.output(IN1, in1)
+    GPIO.output(IN2, in2)
+    GPIO.output(IN3, in3)
+    GPIO.output(IN4, in4)
 
 def forward():
     """前進"""
     print("Forward")
-    GPIO.output(IN1, GPIO.HIGH)
-    GPIO.output(IN2, GPIO.LOW)
-    GPIO.output(IN3, GPIO.HIGH)
-    GPIO.output(IN4, GPIO.LOW)
+    drive('forward', GPIO.HIGH, GPIO.LOW, GPIO.HIGH, GPIO.LOW)
 
 def backward():
     """後退"""
     print("Backward")
-    GPIO.output(IN1, GPIO.LOW)
-    GPIO.output(IN2, GPIO.HIGH)
-    GPIO.output(IN3, GPIO.LOW)
-    GPIO.output(IN4, GPIO.HIGH)
+    drive('backward', GPIO.LOW, GPIO.HIGH, GPIO.LOW, GPIO.HIGH)
 
 def stop():
     """停止"""
     print("Stop")
-    GPIO.output(IN1, GPIO.LOW)
-    GPIO.output(IN2, GPIO.LOW)
-    GPIO.output(IN3, GPIO.LOW)
-    GPIO.output(IN4, GPIO.LOW)
+    drive('stop', GPIO.LOW, GPIO.LOW, GPIO.LOW, GPIO.LOW)
 
 def turn_left():
     """左旋回"""
     print("Turn Left")
-    GPIO.output(IN1, GPIO.LOW)
-    GPIO.output(IN2, GPIO.HIGH)
-    GPIO.output(IN3, GPIO.HIGH)
-    GPIO.output(IN4, GPIO.LOW)
+    drive('left', GPIO.LOW, GPIO.HIGH, GPIO.HIGH, GPIO.LOW)
 
 def turn_right():
     """右旋回"""
     print("Turn Right")
-    GPIO.output(IN1, GPIO.HIGH)
-    GPIO.output(IN2, GPIO.LOW)
-    GPIO.output(IN3, GPIO.LOW)
-    GPIO.output(IN4, GPIO.HIGH)
+    drive('right', GPIO.HIGH, GPIO.LOW, GPIO.LOW, GPIO.HIGH)
+
+# 名前 → 動作（rc_server.py などから使う）
+MOTIONS = {
+    'forward': forward,
+    'backward': backward,
+    'left': turn_left,
+    'right': turn_right,
+    'stop': stop,
+}
 
-try:
-    print("Motor control start!")
+if __name__ == '__main__':
+    try:
+        print("Motor control start!")
 
-    # テスト走行
-    forward()
-    sleep(2)
+        # テスト走行
+        forward()
+        sleep(2)
 
-    stop()
-    sleep(1)
+        stop()
+        sleep(1)
 
-    backward()
-    sleep(2)
+        backward()
+        sleep(2)
 
-    stop()
-    sleep(1)
+        stop()
+        sleep(1)
 
-    turn_left()
-    sleep(1)
+        turn_left()
+        sleep(1)
 
-    stop()
-    sleep(1)
+        stop()
+        sleep(1)
 
-    turn_right()
-    sleep(1)
+        turn_right()
+        sleep(1)
 
-    stop()
-    print("Done!")
+        stop()
+        print("Done!")
 
-finally:
-    GPIO.cleanup()
+    finally:
+        GPIO.cleanup()
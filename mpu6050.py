@@ -0,0 +1,190 @@
+# MPU6050 ドライバ（Raspberry Pi 用）
+# チップ内の FIFO にサンプルを溜めておき、1回の I2C 通信でまとめて読み出す
+# （02_mpu6050_test.ino / 03_inverted_pendulum.ino は1周期ごとに14バイトずつ読んでいる）
+#
+# 接続（Raspberry Pi）:
+#   GPIO2 (SDA) → SDA
+#   GPIO3 (SCL) → SCL
+#   3.3V        → VCC
+#   GND         → GND
+#
+# 使い方:
+#   python3 mpu6050.py          # 実機（smbus2 が必要）
+#   python3 mpu6050.py --sim    # sim_i2c.py の仮想センサーで試す
+#
+#   from mpu6050 import MPU6050
+#   mpu = MPU6050(SMBus(1), sample_rate=200)
+#   for samples in mpu.stream():        # samples: (n, 6) の int16 配列
+#       ax, ay, az, gx, gy, gz = samples[-1]
+
+import argparse
+import time
+
+import numpy as np
+
+try:
+    from smbus2 import SMBus, i2c_msg
+except ImportError:
+    SMBus = i2c_msg = None
+
+MPU6050_ADDR = 0x68
+
+# レジスタアドレス
+SMPLRT_DIV = 0x19
+CONFIG = 0x1A
+GYRO_CONFIG = 0x1B
+ACCEL_CONFIG = 0x1C
+FIFO_EN = 0x23
+INT_STATUS = 0x3A
+ACCEL_XOUT_H = 0x3B
+USER_CTRL = 0x6A
+PWR_MGMT_1 = 0x6B
+FIFO_COUNTH = 0x72
+FIFO_COUNTL = 0x73
+FIFO_R_W = 0x74
+WHO_AM_I = 0x75
+
+# FIFO_EN: 加速度(XYZ) + ジャイロ(XYZ) → 1サンプル12バイト
+FIFO_ACCEL_GYRO = 0x08 | 0x40 | 0x20 | 0x10
+# USER_CTRL
+USER_FIFO_EN = 0x40
+USER_FIFO_RESET = 0x04
+
+FIFO_SIZE = 1024
+SAMPLE_BYTES = 12
+ACCEL_SCALE = 16384.0  # ±2g のときの LSB/g
+GYRO_SCALE = 131.0     # ±250°/s のときの LSB/(°/s)
+
+# 0x68=MPU6050, 0x70=MPU6050互換, 0x98=MPU6050, 0x71=MPU6500
+KNOWN_IDS = (0x68, 0x70, 0x98, 0x71)
+
+
+class MPU6050:
+    """FIFO を使った MPU6050 ドライバ
+
+    read_fifo() は溜まっているサンプルを全部読み、あらかじめ確保した配列の
+    一部（ビュー）を返す。次の read_fifo() で中身は上書きされる。
+    """
+
+    def __init__(self, bus, address=MPU6050_ADDR, sample_rate=200, dlpf=3):
+        self.bus = bus
+        self.address = address
+        self.sample_rate = sample_rate
+        self.dlpf = dlpf
+        self.msg = getattr(bus, 'i2c_msg', i2c_msg)  # sim_i2c は自前の i2c_msg を持つ
+        self.samples = np.empty((FIFO_SIZE // SAMPLE_BYTES, 6), np.int16)
+        self.units = np.empty((FIFO_SIZE // SAMPLE_BYTES, 6), np.float32)
+        self.transactions = 0  # I2C 通信の回数
+        self.sample_count = 0  # 読んだサンプル数
+        self.overflows = 0     # FIFO があふれた回数
+
+    def init(self):
+        whoami = self.read_byte(WHO_AM_I)
+        if whoami not in KNOWN_IDS:
+            raise RuntimeError(f'MPU6050 not found (WHO_AM_I: 0x{whoami:02X})')
+        self.write_byte(PWR_MGMT_1, 0x01)  # スリープ解除、クロックはX軸ジャイロのPLL
+        self.write_byte(CONFIG, self.dlpf)
+        # DLPF が有効なときジャイロの出力は 1kHz、サンプルレート = 1kHz / (1 + SMPLRT_DIV)
+        self.write_byte(SMPLRT_DIV, max(0, min(255, round(1000 / self.sample_rate) - 1)))
+        self.write_byte(GYRO_CONFIG, 0x00)   # ±250°/s
+        self.write_byte(ACCEL_CONFIG, 0x00)  # ±2g
+        self.write_byte(FIFO_EN, FIFO_ACCEL_GYRO)
+        self.reset_fifo()
+
+    def reset_fifo(self):
+        self.write_byte(USER_CTRL, USER_FIFO_RESET)
+        self.write_byte(USER_CTRL, USER_FIFO_EN)
+
+    # ========== 読み出し ==========
+
+    def read_byte(self, reg):
+        self.transactions += 1
+        return self.bus.read_byte_data(self.address, reg)
+
+    def write_byte(self, reg, value):
+        self.transactions += 1
+        self.bus.write_byte_data(self.address, reg, value)
+
+    def read_block(self, reg, length):
+        """レジスタから length バイトを1回の通信で読む（32バイト制限なし）"""
+        self.transactions += 1
+        write = self.msg.write(self.address, [reg])
+        read = self.msg.read(self.address, length)
+        self.bus.i2c_rdwr(write, read)
+        return bytes(read)
+
+    def fifo_count(self):
+        high, low = self.read_block(FIFO_COUNTH, 2)
+        return high << 8 | low
+
+    def read_fifo(self):
+        """FIFO に溜まったサンプルを (n, 6) の int16 配列で返す"""
+        count = self.fifo_count()
+        if count >= FIFO_SIZE:
+            # あふれるとサンプルの区切りがずれるので捨ててやり直す
+            self.overflows += 1
+            self.reset_fifo()
+            return self.samples[:0]
+        n = count // SAMPLE_BYTES
+        if n == 0:
+            return self.samples[:0]
+        raw = self.read_block(FIFO_R_W, n * SAMPLE_BYTES)
+        self.samples[:n] = np.frombuffer(raw, '>i2').reshape(n, 6)
+        self.sample_count += n
+        return self.samples[:n]
+
+    def stream(self, interval=None):
+        """サンプルが溜まるたびに read_fifo() の結果を返し続ける
+
+        interval を省略すると、FIFO が半分くらい埋まる時間ごとに読む。
+        """
+        if interval is None:
+            interval = (FIFO_SIZE // SAMPLE_BYTES // 2) / self.sample_rate
+        next_time = time.monotonic()
+        while True:
+            samples = self.read_fifo()
+            if len(samples):
+                yield samples
+            next_time += interval
+            time.sleep(max(0.0, next_time - time.monotonic()))
+
+    def to_units(self, samples):
+        """生の値を g と °/s に変換する（結果は使い回しの配列）"""
+        out = self.units[:len(samples)]
+        np.multiply(samples[:, :3], 1.0 / ACCEL_SCALE, out=out[:, :3], casting='unsafe')
+        np.multiply(samples[:, 3:], 1.0 / GYRO_SCALE, out=out[:, 3:], casting='unsafe')
+        return out
+
+    def read_sample(self):
+        """FIFO を使わずに最新の値を1つ読む（.ino と同じ14バイト読み出し）"""
+        raw = self.read_block(ACCEL_XOUT_H, 14)
+        ax, ay, az, temp, gx, gy, gz = np.frombuffer(raw, '>i2')
+        self.sample_count += 1
+        return ax, ay, az, gx, gy, gz
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='MPU6050 FIFO stream')
+    parser.add_argument('--sim', action='store_true', help='use the simulated sensor in sim_i2c.py')
+    parser.add_argument('--rate', type=int, default=200)
+    args = parser.parse_args()
+
+    if args.sim:
+        from sim_i2c import SimI2CBus
+        bus = SimI2CBus()
+    else:
+        if SMBus is None:
+            raise SystemExit('smbus2 is not installed (pip install smbus2)')
+        bus = SMBus(1)
+
+    mpu = MPU6050(bus, sample_rate=args.rate)
+    mpu.init()
+    print('MPU6050 OK!')
+    try:
+        for samples in mpu.stream():
+            g = mpu.to_units(samples)
+            accel_angle = np.degrees(np.arctan2(g[:, 1], g[:, 2]))
+            print(f'{len(samples):3d} samples  angle: {accel_angle.mean():6.2f}'
+                  f'  transactions/sample: {mpu.transactions / mpu.sample_count:.3f}')
+    except KeyboardInterrupt:
+        print('\nStopping...')
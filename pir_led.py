@@ -1,19 +1,71 @@
-import RPi.GPIO as GPIO
+import os
+import signal
+import sys
 import time
+from motion_log import MotionRing
+from state_bus import StateBus, SLOT_PIR
 
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(4, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)   # PIRセンサ（入力、プルダウン）
-GPIO.setup(17, GPIO.OUT) # LED（出力）
-
-try:
-    print('PIR sensor monitoring start!')
-    while True:
-        if GPIO.input(4):  # 人を検知したら
-            GPIO.output(17, True)  # LED点灯
-            print('Motion detected! LED ON')
-        else:
-            GPIO.output(17, False) # LED消灯
-        time.sleep(0.1)
-except KeyboardInterrupt:
-    print('\nStopping...')
-    GPIO.cleanup()
+if os.environ.get('GPIO_DAEMON'):
+    import daemon_gpio as GPIO  # gpio_daemon.py 経由（初期化済み・ピンの取り合いなし）
+elif os.environ.get('GPIO_SIM'):
+    import sim_gpio as GPIO  # 実機なしで動かすとき
+else:
+    import RPi.GPIO as GPIO
+
+PIR_PIN = 4
+LED_PIN = 17
+POLL_INTERVAL = 0.1
+
+
+class MotionWatcher:
+    """PIRセンサーを読んで、変化したときだけLED・記録・表示を更新する"""
+
+    def __init__(self, bus, log):
+        self.bus = bus  # 他のプロセスに検知状態を知らせる
+        self.log = log  # 検知の開始・終了を記録（python3 motion_log.py で集計）
+        self.motion_count = 0
+        self.prev_motion = False
+
+    def poll(self):
+        motion = bool(GPIO.input(PIR_PIN))
+        if motion != self.prev_motion:
+            self.motion_count += motion
+            GPIO.output(LED_PIN, motion)  # LED点灯／消灯
+            self.bus.write(SLOT_PIR, pins={PIR_PIN: motion, LED_PIN: motion},
+                           counter=self.motion_count, value=int(motion))
+            self.log.record(motion)
+            print('Motion detected! LED ON' if motion else 'Motion ended. LED OFF')
+            self.prev_motion = motion
+        return motion
+
+    def close(self):
+        """検知中に止めたときは、そこで検知が終わったことにして記録を書き出す
+
+        （止まっていた間がずっと在室として集計されないように）
+        """
+        if self.prev_motion:
+            self.log.record(False)
+            self.bus.write(SLOT_PIR, pins={PIR_PIN: 0, LED_PIN: 0}, value=0)
+            self.prev_motion = False
+        self.log.flush()
+
+
+if __name__ == '__main__':
+    GPIO.setmode(GPIO.BCM)
+    GPIO.setup(PIR_PIN, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)   # PIRセンサ（入力、プルダウン）
+    GPIO.setup(LED_PIN, GPIO.OUT) # LED（出力）
+
+    # kill（SIGTERM）でも finally で記録を閉じる
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    watcher = MotionWatcher(StateBus(), MotionRing())
+    try:
+        print('PIR sensor monitoring start!')
+        while True:
+            watcher.poll()
+            watcher.log.maybe_flush()
+            time.sleep(POLL_INTERVAL)
+    except KeyboardInterrupt:
+        print('\nStopping...')
+    finally:
+        watcher.close()
+        GPIO.cleanup()
@@ -0,0 +1,330 @@
+# 3Dプリントの材料・時間の見積もり（スライスせずに）
+# fusion_sim.py で Fusion 360 スクリプトを実行した記録、または STL から
+# 体積・重さ・表面積・おおよその印刷時間を求める
+#
+# 押し出しの記録は、z の区切りごとに XY 平面を格子で塗り分けて（join/cut/intersect を順番に適用）
+# 体積と表面積を出す。プロファイルの塗り分けはキャッシュするので、
+# 厚みだけを変えた設計案などはほとんど計算し直さない。
+#
+# 使い方:
+#   python3 print_cost.py esp32_rc_car/fusion/FloorPlate.py
+#   python3 print_cost.py esp32_rc_car/fusion/FloorPlate.py --vary floor_thickness=3,4,5,6
+#   python3 print_cost.py original_car/wheel_spoke/wheel_spoke.py --vary num_spokes=3,4,5,6 --vary spoke_width=4,6
+#   python3 print_cost.py part.stl
+#   python3 print_cost.py --check            # join/cut/intersect の体積を手計算の値と比べる
+
+import argparse
+import itertools
+import math
+import re
+import time
+from collections import namedtuple
+
+import numpy as np
+
+import fusion_sim
+
+RESOLUTION = 0.25  # 格子の間隔（mm）
+
+# 印刷設定（PLA・0.4mm ノズルのよくある設定）
+PrintSettings = namedtuple('PrintSettings', [
+    'layer_height',      # mm
+    'line_width',        # mm
+    'walls',             # 外周の本数
+    'top_bottom_layers',
+    'infill',            # 充填率 0〜1
+    'density',           # g/cm3
+    'wall_speed',        # mm/s
+    'infill_speed',      # mm/s
+    'layer_overhead',    # 1層ごとの移動・リトラクトなどの時間（秒）
+    'price_per_kg',      # 円/kg
+])
+DEFAULT_SETTINGS = PrintSettings(0.2, 0.4, 2, 4, 0.2, 1.24, 40.0, 60.0, 2.0, 2500.0)
+
+# 1つの部品の形（単位 mm）
+Geometry = namedtuple('Geometry', 'name volume side_area flat_area height')
+
+
+# ========== 押し出しの記録から ==========
+
+class Rasterizer:
+    """プロファイルを格子の中心で塗り分ける（格子は原点を基準に固定）
+
+    同じ形のプロファイルは設計案が違っても同じ配列を使い回す。
+    """
+
+    def __init__(self, resolution=RESOLUTION):
+        self.res = resolution
+        self.cache = {}
+
+    def profile_key(self, p):
+        if p.kind == 'polygon':
+            return ('polygon', tuple(p.points))
+        return (p.kind, p.center, p.radius, p.inner_radius)
+
+    def bounds(self, p):
+        """プロファイルを囲む格子のインデックス範囲 (i0, j0, i1, j1)（mm 単位の座標）"""
+        if p.kind == 'polygon':
+            pts = np.asarray(p.points) * 10
+            lo, hi = pts.min(axis=0), pts.max(axis=0)
+        else:
+            c = np.asarray(p.center) * 10
+            lo, hi = c - p.radius * 10, c + p.radius * 10
+        return (int(math.floor(lo[0] / self.res)), int(math.floor(lo[1] / self.res)),
+                int(math.ceil(hi[0] / self.res)), int(math.ceil(hi[1] / self.res)))
+
+    def mask(self, p):
+        """(i0, j0, mask) を返す。mask[y, x] は格子の中心がプロファイルの内側か"""
+        key = self.profile_key(p)
+        if key in self.cache:
+            return self.cache[key]
+        i0, j0, i1, j1 = self.bounds(p)
+        x = (np.arange(i0, i1) + 0.5) * self.res
+        y = (np.arange(j0, j1) + 0.5) * self.res
+        if p.kind == 'polygon':
+            mask = points_in_polygon(x, y, np.asarray(p.points) * 10)
+        else:
+            cx, cy = np.asarray(p.center) * 10
+            d2 = (x[None, :] - cx) ** 2 + (y[:, None] - cy) ** 2
+            mask = d2 <= (p.radius * 10) ** 2
+            if p.kind == 'ring':
+                mask &= d2 > (p.inner_radius * 10) ** 2
+        self.cache[key] = (i0, j0, mask)
+        return self.cache[key]
+
+
+def points_in_polygon(x, y, pts):
+    """格子 (y, x) の各点が多角形の内側か（偶奇規則）"""
+    inside = np.zeros((len(y), len(x)), bool)
+    X = x[None, :]
+    for (x1, y1), (x2, y2) in zip(pts, np.roll(pts, -1, axis=0)):
+        if y1 == y2:
+            continue
+        crosses = (y[:, None] >= min(y1, y2)) & (y[:, None] < max(y1, y2))
+        x_cross = x1 + (y[:, None] - y1) * (x2 - x1) / (y2 - y1)
+        inside ^= crosses & (X < x_cross)
+    return inside
+
+
+# Crofton の公式で使う方向 (dy, dx) と、その方向が受け持つ角度の幅
+CROFTON_DIRECTIONS = [((0, 1), math.atan(0.5)), ((1, 0), math.atan(0.5)),
+                      ((1, 1), math.pi / 4 - math.atan(0.5)), ((1, -1), math.pi / 4 - math.atan(0.5))] + \
+                     [(d, math.pi / 8) for d in ((1, 2), (2, 1), (1, -2), (2, -1))]
+
+
+def perimeter(mask, res):
+    """塗り分けた領域の周の長さ（Crofton の公式、8方向の境界の数から）
+
+    格子の段差をそのまま数えるより斜めの辺・円弧の誤差が小さい。4方向だと
+    円は合うが軸に沿った辺が約5%短くなる（部品の多くは長方形）。8方向にすると
+    どの向きの辺も誤差は2%以内。
+    """
+    m = np.pad(mask, 2)
+    rows, cols = m.shape
+    total = 0.0
+    for (dy, dx), angle in CROFTON_DIRECTIONS:
+        a = m[dy:, max(dx, 0):cols + min(dx, 0)]
+        b = m[:rows - dy, max(-dx, 0):cols - max(dx, 0)]
+        # 方向 (dy, dx) の直線の間隔は res / |(dy, dx)|
+        total += angle / 2 * res / math.hypot(dx, dy) * np.count_nonzero(a != b)
+    return total
+
+
+def component_geometry(comp, raster):
+    """1つのコンポーネントの押し出しを順番に適用して、体積・側面積・上下面の面積を求める"""
+    records = [(e.operation, raster.mask(e.profile), e.z0 * 10, (e.z0 + e.height) * 10)
+               for e in comp.extrudes]
+    i0 = min(i for _, (i, _, _), _, _ in records)
+    j0 = min(j for _, (_, j, _), _, _ in records)
+    i1 = max(i + m.shape[1] for _, (i, _, m), _, _ in records)
+    j1 = max(j + m.shape[0] for _, (_, j, m), _, _ in records)
+    levels = sorted({z for _, _, z0, z1 in records for z in (z0, z1)})
+    # 削る・共通部分は、それより前に作った形だけに効く（Fusion と同じ）
+    region = np.zeros((len(levels) - 1, j1 - j0, i1 - i0), bool)
+    lo = np.asarray(levels[:-1])
+    hi = np.asarray(levels[1:])
+    for operation, (i, j, mask), z0, z1 in records:
+        slabs = (lo >= z0 - 1e-9) & (hi <= z1 + 1e-9)
+        window = region[:, j - j0:j - j0 + mask.shape[0], i - i0:i - i0 + mask.shape[1]]
+        if operation in (fusion_sim.NEW_BODY, fusion_sim.JOIN):
+            window[slabs] |= mask
+        elif operation == fusion_sim.CUT:
+            window[slabs] &= ~mask
+        else:
+            # 道具の形の外側は、枠の外も含めて全部消す
+            full = np.zeros(region.shape[1:], bool)
+            full[j - j0:j - j0 + mask.shape[0], i - i0:i - i0 + mask.shape[1]] = mask
+            region[slabs] &= full
+            region[~slabs] = False
+
+    cell = raster.res ** 2
+    heights = hi - lo
+    areas = region.sum(axis=(1, 2)) * cell
+    padded = np.concatenate((np.zeros((1,) + region.shape[1:], bool), region,
+                             np.zeros((1,) + region.shape[1:], bool)))
+    flat = np.count_nonzero(padded[1:] != padded[:-1]) * cell
+    side = sum(perimeter(region[k], raster.res) * heights[k] for k in range(len(heights)) if areas[k])
+    solid = np.flatnonzero(areas)
+    height = hi[solid[-1]] - lo[solid[0]] if len(solid) else 0.0
+    return Geometry(comp.name, float((areas * heights).sum()), side, flat, float(height))
+
+
+def design_geometry(design, raster=None):
+    raster = raster or Rasterizer()
+    return [component_geometry(comp, raster) for comp in design.components if comp.extrudes]
+
+
+# ========== STL から ==========
+
+def load_stl(path):
+    """三角形の頂点 (n, 3, 3) を返す（バイナリ・テキストの両方）"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) >= 84:
+        count = int(np.frombuffer(data, '<u4', 1, 80)[0])
+        if len(data) == 84 + count * 50:
+            record = np.dtype([('normal', '<f4', 3), ('v', '<f4', (3, 3)), ('attr', '<u2')])
+            return np.frombuffer(data, record, count, 84)['v'].astype(float)
+    numbers = re.findall(rb'vertex\s+(\S+)\s+(\S+)\s+(\S+)', data)
+    return np.array(numbers, float).reshape(-1, 3, 3)
+
+
+def mesh_geometry(triangles, name='mesh'):
+    """閉じた三角形メッシュの体積（符号付き四面体の和）と表面積
+
+    法線が 45° より寝ている面を上下面、それ以外を側面として数える。
+    """
+    v0, v1, v2 = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    cross = np.cross(v1 - v0, v2 - v0)
+    area = np.linalg.norm(cross, axis=1) / 2
+    volume = abs(np.einsum('ij,ij->', v0, np.cross(v1, v2))) / 6
+    nz = np.abs(cross[:, 2]) / np.maximum(2 * area, 1e-30)
+    flat = area[nz > math.cos(math.radians(45))].sum()
+    height = triangles[:, :, 2].max() - triangles[:, :, 2].min()
+    return Geometry(name, float(volume), float(area.sum() - flat), float(flat), float(height))
+
+
+# ========== 見積もり ==========
+
+def estimate(geometries, settings=DEFAULT_SETTINGS):
+    """Geometry のリストをまとめて見積もる（各項目は部品ごとの配列）
+
+    外周 = 側面積 × 外周の本数 × 線幅、上下の塗りつぶし = 上下面の面積 × 上下の層の厚み、
+    残りに充填率をかける。線の長さを速度で割り、層ごとの時間を足して印刷時間にする。
+    """
+    s = settings
+    volume = np.array([g.volume for g in geometries])
+    side = np.array([g.side_area for g in geometries])
+    flat = np.array([g.flat_area for g in geometries])
+    height = np.array([g.height for g in geometries])
+
+    walls = np.minimum(side * s.walls * s.line_width, volume)
+    skin = np.minimum(flat * s.top_bottom_layers * s.layer_height, volume - walls)
+    infill = (volume - walls - skin) * s.infill
+    printed = walls + skin + infill
+    bead = s.line_width * s.layer_height
+    seconds = (walls / bead / s.wall_speed + (skin + infill) / bead / s.infill_speed
+               + np.ceil(height / s.layer_height) * s.layer_overhead)
+    mass = printed / 1000 * s.density
+    return {
+        'volume_cm3': volume / 1000,
+        'surface_cm2': (side + flat) / 100,
+        'mass_g': mass,
+        'filament_m': printed / (math.pi * 1.75 ** 2 / 4) / 1000,
+        'minutes': seconds / 60,
+        'cost_yen': mass / 1000 * s.price_per_kg,
+    }
+
+
+def script_variants(path, vary, raster=None):
+    """パラメータの組み合わせごとにスクリプトを実行して [(params, [Geometry, ...]), ...] を返す"""
+    raster = raster or Rasterizer()
+    names = list(vary)
+    results = []
+    for values in itertools.product(*(vary[n] for n in names)):
+        params = dict(zip(names, values))
+        design = fusion_sim.run_script(path, params)
+        results.append((params, design_geometry(design, raster)))
+    return results
+
+
+def _box(name, operations):
+    """[(operation, 'rect' / 'circle', 大きさ mm, z0 mm, 高さ mm), ...] から部品を作る（中心は原点）"""
+    comp = fusion_sim.Component(fusion_sim.Design(), name)
+    for operation, kind, size, z0, height in operations:
+        if kind == 'rect':
+            h = size / 20
+            profile = fusion_sim.Profile('polygon', z0 / 10, points=[(-h, -h), (h, -h), (h, h), (-h, h)])
+        else:
+            profile = fusion_sim.Profile('circle', z0 / 10, center=(0.0, 0.0), radius=size / 20)
+        comp.extrudes.append(fusion_sim.Extrusion(operation, profile, z0 / 10, height / 10))
+    return comp
+
+
+def self_check(raster=None):
+    """手計算できる形で体積・側面積を確かめる。合わなかったものの説明のリストを返す"""
+    raster = raster or Rasterizer()
+    base = (fusion_sim.NEW_BODY, 'rect', 40, 0, 10)   # 40x40x10mm = 16000mm3
+    cases = [
+        ('join', [base, (fusion_sim.JOIN, 'rect', 10, 10, 10)], 'volume', 17000.0, 0.001),
+        ('cut', [base, (fusion_sim.CUT, 'circle', 10, 0, 10)], 'volume', 16000 - math.pi * 25 * 10, 0.005),
+        ('intersect', [base, (fusion_sim.INTERSECT, 'rect', 10, 0, 10)], 'volume', 1000.0, 0.001),
+        ('intersect_z', [base, (fusion_sim.INTERSECT, 'rect', 10, 0, 5)], 'volume', 500.0, 0.001),
+        ('box_side', [base], 'side_area', 1600.0, 0.02),
+        ('cylinder_side', [(fusion_sim.NEW_BODY, 'circle', 20, 0, 10)], 'side_area', math.pi * 20 * 10, 0.02),
+    ]
+    failures = []
+    for name, operations, field, expected, tolerance in cases:
+        got = getattr(component_geometry(_box(name, operations), raster), field)
+        if abs(got - expected) > tolerance * expected:
+            failures.append(f'{name}: {field} {got:.1f} != {expected:.1f} (±{tolerance:.1%})')
+    return failures
+
+
+def parse_vary(items):
+    vary = {}
+    for item in items:
+        name, _, values = item.partition('=')
+        vary[name] = [float(v) if '.' in v else int(v) for v in values.split(',')]
+    return vary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Estimate filament, mass and print time')
+    parser.add_argument('source', nargs='?', help='Fusion 360 script (.py) or mesh (.stl)')
+    parser.add_argument('--vary', action='append', default=[], metavar='NAME=V1,V2,...',
+                        help='script parameter to sweep (repeat for a grid)')
+    parser.add_argument('--resolution', type=float, default=RESOLUTION, help='grid size in mm')
+    parser.add_argument('--infill', type=float, default=DEFAULT_SETTINGS.infill)
+    parser.add_argument('--walls', type=int, default=DEFAULT_SETTINGS.walls)
+    parser.add_argument('--layer-height', type=float, default=DEFAULT_SETTINGS.layer_height)
+    parser.add_argument('--check', action='store_true', help='check volumes against hand-computed shapes')
+    args = parser.parse_args()
+
+    if args.check:
+        failures = self_check(Rasterizer(args.resolution))
+        print('\n'.join(failures) or 'all checks passed')
+        raise SystemExit(1 if failures else 0)
+    if not args.source:
+        parser.error('source is required')
+
+    settings = DEFAULT_SETTINGS._replace(infill=args.infill, walls=args.walls, layer_height=args.layer_height)
+    start = time.perf_counter()
+    if args.source.lower().endswith('.stl'):
+        rows = [({}, [mesh_geometry(load_stl(args.source), args.source)])]
+    else:
+        rows = script_variants(args.source, parse_vary(args.vary), Rasterizer(args.resolution))
+    # 全案・全部品をまとめて1回で見積もる
+    flat_geoms = [g for _, geoms in rows for g in geoms]
+    est = estimate(flat_geoms, settings)
+    elapsed = time.perf_counter() - start
+
+    print(f'{"variant":<32} {"part":<14} {"volume":>9} {"surface":>9} {"mass":>8} {"time":>8} {"cost":>7}')
+    k = 0
+    for params, geoms in rows:
+        label = ' '.join(f'{n}={v}' for n, v in params.items()) or '-'
+        for g in geoms:
+            print(f'{label:<32} {g.name:<14} {est["volume_cm3"][k]:7.2f}cm3 {est["surface_cm2"][k]:7.1f}cm2'
+                  f' {est["mass_g"][k]:6.1f}g {est["minutes"][k]:6.1f}min {est["cost_yen"][k]:5.0f}円')
+            k += 1
+    print(f'{len(rows)} variant(s) in {elapsed * 1000:.1f} ms ({elapsed * 1000 / len(rows):.2f} ms/variant)')
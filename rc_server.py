@@ -0,0 +1,276 @@
+# Raspberry Pi 版 RCカーサーバー（asyncio）
+# esp32_rc_car/controller.html をそのまま配信し、ボタン操作を motor_control.py の動作につなぐ
+#
+# 使い方:
+#   python3 rc_server.py                 # ポート8080で起動
+#   GPIO_SIM=1 python3 rc_server.py      # 実機なしで試す
+#   ブラウザで http://<PiのIP>:8080/ を開き、IP欄に「<PiのIP>:8080」と入力
+#
+# エンドポイント（ESP32版と同じ）:
+#   /  /forward  /backward  /left  /right  /stop
+#   /ws  … WebSocket（テキストで "forward" などを送る）
+#   返事の "OK: Forward" は「受け付けた」という意味で、モーターが動いたことは保証しない
+#   （動作に失敗したときはサーバーのログに出る。結果まで知りたいときは下の ?id= を使う）
+#
+# 遅延の計測（latency_trace.py）:
+#   /forward?id=17 のように id を付けると、モーターを動かし終えてから返事をし、
+#   X-Trace ヘッダーに受信・解析・動作の時刻（マイクロ秒）を入れる
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import os
+import struct
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from motor_control import GPIO, MOTIONS
+
+HTML_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'esp32_rc_car', 'controller.html')
+WS_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+WS_MAX_PAYLOAD = 1024
+
+
+class CommandQueue:
+    """最新のコマンドだけを実行するキュー
+
+    GPIO操作中に届いたコマンドは上書きされ、最後の1つだけが実行される。
+    ピン操作は専用スレッドで行うので、イベントループは止まらない。
+    submit() は Future を返し、ピンを動かし終えた時刻（マイクロ秒）が入る。
+    上書きされて実行されなかったコマンドは None になる。
+    動作が例外を出したときは、その例外が Future に入り、ログにも出す（キューは止まらない）。
+    """
+
+    def __init__(self, motions):
+        self.motions = motions
+        self.pending = None
+        self.event = asyncio.Event()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.executed = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def submit(self, name):
+        if self.pending is not None:
+            self.dropped += 1
+            if not self.pending[1].done():
+                self.pending[1].set_result(None)
+        done = asyncio.get_running_loop().create_future()
+        # 返事を待たない（?id= のない）リクエストでも、失敗をここで受け取ってログに出す
+        done.add_done_callback(lambda f: self.report_failure(name, f))
+        self.pending = (name, done)
+        self.event.set()
+        return done
+
+    def report_failure(self, name, future):
+        if not future.cancelled() and future.exception() is not None:
+            self.failed += 1
+            print(f'Motion {name} failed: {future.exception()!r}')
+
+    def actuate(self, name):
+        self.motions[name]()
+        return micros()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.event.wait()
+            self.event.clear()
+            (name, done), self.pending = self.pending, None
+            try:
+                actuated = await loop.run_in_executor(self.executor, self.actuate, name)
+            except Exception as e:
+                if not done.done():
+                    done.set_exception(e)
+                continue
+            self.executed += 1
+            if not done.done():
+                done.set_result(actuated)
+
+
+def micros():
+    return time.monotonic_ns() // 1000
+
+
+def http_response(status, body, content_type='text/plain', keep_alive=True, extra_headers=None):
+    if isinstance(body, str):
+        body = body.encode()
+    extra = ''.join(f'{key}: {value}\r\n' for key, value in (extra_headers or {}).items())
+    head = (f'HTTP/1.1 {status}\r\n'
+            f'Content-Type: {content_type}\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            'Access-Control-Allow-Origin: *\r\n'
+            f'{extra}'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n'
+            '\r\n')
+    return head.encode() + body
+
+
+def parse_request(data):
+    """リクエスト行とヘッダーを (method, path, query, headers) にする"""
+    lines = data.decode('latin-1').split('\r\n')
+    method, target, version = lines[0].split(' ', 2)
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            key, value = line.split(':', 1)
+            headers[key.strip().lower()] = value.strip()
+    if version == 'HTTP/1.0' and headers.get('connection', '').lower() != 'keep-alive':
+        headers.setdefault('connection', 'close')
+    path, _, query = target.partition('?')
+    return method, path, dict(urllib.parse.parse_qsl(query)), headers
+
+
+class RCServer:
+    def __init__(self, queue, html):
+        self.queue = queue
+        self.html = html
+        self.clients = 0
+
+    async def handle(self, reader, writer):
+        self.clients += 1
+        try:
+            # keep-alive: 同じ接続で次々にリクエストを処理する
+            while True:
+                try:
+                    data = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                received = micros()
+                try:
+                    method, path, query, headers = parse_request(data)
+                    length = int(headers.get('content-length', '0') or 0)
+                    if length < 0:
+                        raise ValueError('negative Content-Length')
+                except ValueError:
+                    writer.write(http_response('400 Bad Request', 'Bad Request', keep_alive=False))
+                    break
+                if length:
+                    await reader.readexactly(length)
+
+                if path == '/ws' and headers.get('upgrade', '').lower() == 'websocket':
+                    await self.websocket(reader, writer, headers)
+                    break
+
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(await self.route(method, path, query, keep_alive, received))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.clients -= 1
+            writer.close()
+
+    async def route(self, method, path, query, keep_alive, received):
+        if method == 'OPTIONS':
+            return http_response('204 No Content', b'', keep_alive=keep_alive)
+        if path == '/':
+            return http_response('200 OK', self.html, 'text/html; charset=utf-8', keep_alive)
+        name = path.lstrip('/')
+        if name in MOTIONS:
+            parsed = micros()
+            done = self.queue.submit(name)
+            trace = None
+            if 'id' in query:
+                try:
+                    actuated = await done
+                except Exception as e:
+                    return http_response('500 Internal Server Error', f'{name} failed: {e}',
+                                         keep_alive=keep_alive)
+                trace = {'X-Trace': f'id={query["id"]} recv={received} parse={parsed} '
+                                    f'act={"-" if actuated is None else actuated} reply={micros()}',
+                         'Access-Control-Expose-Headers': 'X-Trace'}
+            return http_response('200 OK', 'OK: ' + name.capitalize(), keep_alive=keep_alive,
+                                 extra_headers=trace)
+        return http_response('404 Not Found', 'Not Found', keep_alive=keep_alive)
+
+    async def websocket(self, reader, writer, headers):
+        key = headers.get('sec-websocket-key', '').encode()
+        accept = base64.b64encode(hashlib.sha1(key + WS_GUID).digest()).decode()
+        writer.write(('HTTP/1.1 101 Switching Protocols\r\n'
+                      'Upgrade: websocket\r\n'
+                      'Connection: Upgrade\r\n'
+                      f'Sec-WebSocket-Accept: {accept}\r\n\r\n').encode())
+        await writer.drain()
+
+        while True:
+            opcode, payload = await ws_recv(reader)
+            if opcode == 0x8:  # close
+                writer.write(ws_frame(0x8, payload[:2]))
+                await writer.drain()
+                return
+            if opcode == 0x9:  # ping
+                writer.write(ws_frame(0xA, payload))
+            elif opcode == 0x1:  # text
+                name = payload.decode('utf-8', 'replace').strip()
+                if name in MOTIONS:
+                    self.queue.submit(name)
+                    writer.write(ws_frame(0x1, 'OK: ' + name.capitalize()))
+                else:
+                    writer.write(ws_frame(0x1, 'Unknown command'))
+            await writer.drain()
+
+
+async def ws_recv(reader):
+    """WebSocketフレームを1つ読む（クライアントからはマスク付き）"""
+    b1, b2 = await reader.readexactly(2)
+    opcode = b1 & 0x0F
+    length = b2 & 0x7F
+    if length == 126:
+        length = struct.unpack('!H', await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', await reader.readexactly(8))[0]
+    if length > WS_MAX_PAYLOAD:
+        raise ConnectionError('WebSocket frame too large')
+    mask = await reader.readexactly(4) if b2 & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return opcode, payload
+
+
+def ws_frame(opcode, payload):
+    """WebSocketフレームを作る（サーバーからはマスクなし）"""
+    if isinstance(payload, str):
+        payload = payload.encode()
+    if len(payload) < 126:
+        head = bytes([0x80 | opcode, len(payload)])
+    else:
+        head = bytes([0x80 | opcode, 126]) + struct.pack('!H', len(payload))
+    return head + payload
+
+
+async def main(host, port):
+    with open(HTML_PATH, 'rb') as f:
+        html = f.read()
+    queue = CommandQueue(MOTIONS)
+    rc = RCServer(queue, html)
+    worker = asyncio.create_task(queue.run())
+    server = await asyncio.start_server(rc.handle, host, port)
+    print(f'RC server started! http://{host}:{port}/')
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        worker.cancel()
+        queue.executor.shutdown(wait=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Raspberry Pi RC car server')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main(args.host, args.port))
+    except KeyboardInterrupt:
+        print('\nStopping...')
+    finally:
+        MOTIONS['stop']()
+        GPIO.cleanup()
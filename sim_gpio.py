@@ -0,0 +1,144 @@
+# RPi.GPIO 互換のシミュレーション用モジュール
+# 実機がなくてもスクリプトを動かせるように、ピンの状態をメモリ上に保持する
+#
+# 使い方:
+#   GPIO_SIM=1 python3 motor_control.py
+#   （gpiozero の GPIOZERO_PIN_FACTORY=mock と同じ考え方）
+#   fade.py・blink.py など gpiozero を使うものは install_gpiozero() で代わりを入れる
+
+import sys
+import threading
+import types
+
+BCM = 11
+BOARD = 10
+OUT = 0
+IN = 1
+LOW = 0
+HIGH = 1
+PUD_OFF = 20
+PUD_DOWN = 21
+PUD_UP = 22
+
+_lock = threading.Lock()
+_mode = None
+_directions = {}
+_levels = {}
+# 出力が変わるたびに呼ばれる関数（ベンチマークやテストで遅延を測る用）
+listeners = []
+
+
+def setmode(mode):
+    global _mode
+    _mode = mode
+
+
+def getmode():
+    return _mode
+
+
+def setwarnings(flag):
+    pass
+
+
+def setup(channel, direction, pull_up_down=PUD_OFF, initial=LOW):
+    for ch in _channels(channel):
+        with _lock:
+            _directions[ch] = direction
+            if direction == OUT:
+                _levels[ch] = int(bool(initial))
+            else:
+                _levels[ch] = HIGH if pull_up_down == PUD_UP else LOW
+
+
+def output(channel, value):
+    channels = _channels(channel)
+    values = value if isinstance(value, (list, tuple)) else [value] * len(channels)
+    with _lock:
+        for ch, v in zip(channels, values):
+            if _directions.get(ch) != OUT:
+                raise RuntimeError('The GPIO channel has not been set up as an OUTPUT')
+            _levels[ch] = int(bool(v))
+    for listener in listeners:
+        listener(channels, values)
+
+
+def input(channel):
+    with _lock:
+        if channel not in _directions:
+            raise RuntimeError('You must setup() the GPIO channel first')
+        return _levels[channel]
+
+
+def cleanup(channel=None):
+    global _mode
+    with _lock:
+        if channel is None:
+            _directions.clear()
+            _levels.clear()
+            _mode = None
+        else:
+            for ch in _channels(channel):
+                _directions.pop(ch, None)
+                _levels.pop(ch, None)
+
+
+# ========== シミュレーション専用 ==========
+
+def set_input(channel, value):
+    """入力ピンの値を外から変える（センサーの代わり）"""
+    with _lock:
+        _levels[channel] = int(bool(value))
+
+
+def levels():
+    """全ピンの状態をコピーして返す"""
+    with _lock:
+        return dict(_levels)
+
+
+# ========== gpiozero の代わり ==========
+
+class SimLED:
+    """gpiozero.LED の代わり（on / off / value）。状態は上のピンに入る"""
+
+    def __init__(self, pin):
+        self.pin = pin
+        self._value = 0.0
+        setup(pin, OUT)
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+        output(self.pin, HIGH if value > 0 else LOW)
+
+    def on(self):
+        self.value = 1.0
+
+    def off(self):
+        self.value = 0.0
+
+
+class SimPWMLED(SimLED):
+    """gpiozero.PWMLED の代わり（value は 0〜1 の明るさ、ピンは 0 より大きければ HIGH）"""
+
+
+def install_gpiozero():
+    """gpiozero モジュールを sys.modules に登録する（LED と PWMLED だけ）"""
+    if getattr(sys.modules.get('gpiozero'), 'SIMULATED', False):
+        return
+    gpiozero = types.ModuleType('gpiozero')
+    gpiozero.SIMULATED = True
+    gpiozero.LED = SimLED
+    gpiozero.PWMLED = SimPWMLED
+    sys.modules['gpiozero'] = gpiozero
+
+
+def _channels(channel):
+    if isinstance(channel, (list, tuple)):
+        return list(channel)
+    return [channel]
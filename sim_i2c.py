@@ -0,0 +1,190 @@
+# smbus2 互換のシミュレーション用 I2C バス
+# 仮想の MPU6050（アドレス 0x68）がつながっている
+# FIFO・サンプルレート設定・14バイト読み出しに対応し、時間の経過に合わせてサンプルを作る
+#
+# 使い方:
+#   from sim_i2c import SimI2CBus
+#   bus = SimI2CBus()                 # 通信時間なし
+#   bus = SimI2CBus(bus_hz=400000)    # 400kHz の I2C にかかる時間も待つ
+
+import math
+import time
+
+import numpy as np
+
+# レジスタの番号・ビットは mpu6050.py のものを使う（実機用のドライバと食い違わないように）
+from mpu6050 import (
+    MPU6050_ADDR, FIFO_SIZE, SAMPLE_BYTES,
+    SMPLRT_DIV, CONFIG, FIFO_EN, INT_STATUS, ACCEL_XOUT_H, USER_CTRL, PWR_MGMT_1,
+    FIFO_COUNTH, FIFO_COUNTL, FIFO_R_W, WHO_AM_I,
+    FIFO_ACCEL_GYRO, USER_FIFO_EN, USER_FIFO_RESET,
+)
+
+
+class SimMessage:
+    """smbus2.i2c_msg の代わり"""
+
+    def __init__(self, addr, write_data=None, length=0):
+        self.addr = addr
+        self.write_data = bytes(write_data) if write_data is not None else None
+        self.len = len(self.write_data) if write_data is not None else length
+        self.buf = b''
+
+    @staticmethod
+    def write(addr, data):
+        return SimMessage(addr, write_data=data)
+
+    @staticmethod
+    def read(addr, length):
+        return SimMessage(addr, length=length)
+
+    def __bytes__(self):
+        return self.buf
+
+    def __iter__(self):
+        return iter(self.buf)
+
+
+class SimMPU6050:
+    """時間に合わせてサンプルを作る仮想 MPU6050
+
+    signal(t) は時刻 t（秒、配列）に対する (ax, ay, az, gx, gy, gz) の生の値を返す関数。
+    省略すると、0.5Hz でゆっくり ±10° 揺れている状態を作る。
+    """
+
+    def __init__(self, signal=None, clock=time.monotonic, noise=20, seed=0):
+        self.regs = bytearray(128)
+        self.regs[WHO_AM_I] = 0x68
+        self.regs[PWR_MGMT_1] = 0x40  # 電源投入時はスリープ
+        self.fifo = bytearray()
+        self.signal = signal or tilt_signal
+        self.clock = clock
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+        self.last_sample_time = clock()
+
+    @property
+    def sample_rate(self):
+        gyro_rate = 8000 if self.regs[CONFIG] & 0x07 in (0, 7) else 1000
+        return gyro_rate / (1 + self.regs[SMPLRT_DIV])
+
+    @property
+    def sleeping(self):
+        return bool(self.regs[PWR_MGMT_1] & 0x40)
+
+    def samples(self, t):
+        data = np.asarray(self.signal(np.asarray(t, float)), float).T.reshape(-1, 6)
+        if self.noise:
+            data = data + self.rng.normal(0, self.noise, data.shape)
+        return np.clip(np.round(data), -32768, 32767).astype('>i2')
+
+    def advance(self):
+        """前回からの経過時間分のサンプルを FIFO に入れる"""
+        now = self.clock()
+        if self.sleeping:
+            self.last_sample_time = now
+            return
+        period = 1.0 / self.sample_rate
+        n = int((now - self.last_sample_time) / period)
+        if n <= 0:
+            return
+        times = self.last_sample_time + period * np.arange(1, n + 1)
+        self.last_sample_time += n * period
+        fifo_on = (self.regs[USER_CTRL] & USER_FIFO_EN
+                   and self.regs[FIFO_EN] & FIFO_ACCEL_GYRO == FIFO_ACCEL_GYRO)
+        if fifo_on:
+            n = min(n, FIFO_SIZE // SAMPLE_BYTES + 1)
+            self.fifo += self.samples(times[-n:]).tobytes()
+            if len(self.fifo) > FIFO_SIZE:
+                # あふれたら古いデータから捨てる（実機と同じくサンプルの区切りがずれる）
+                del self.fifo[:len(self.fifo) - FIFO_SIZE]
+                self.regs[INT_STATUS] |= 0x10
+        latest = self.samples(times[-1:])[0]
+        # 加速度・温度・ジャイロの順に14バイト
+        self.regs[ACCEL_XOUT_H:ACCEL_XOUT_H + 6] = latest[:3].tobytes()
+        self.regs[ACCEL_XOUT_H + 8:ACCEL_XOUT_H + 14] = latest[3:].tobytes()
+
+    def write(self, reg, value):
+        self.advance()
+        if reg == USER_CTRL and value & USER_FIFO_RESET:
+            self.fifo.clear()
+            value &= ~USER_FIFO_RESET
+        if reg == PWR_MGMT_1 and value & 0x80:  # DEVICE_RESET
+            self.__init__(self.signal, self.clock, self.noise)
+            return
+        self.regs[reg] = value
+
+    def read(self, reg, length):
+        self.advance()
+        if reg == FIFO_R_W:
+            data = bytes(self.fifo[:length])
+            del self.fifo[:length]
+            return data.ljust(length, b'\xff')
+        out = bytearray()
+        for i in range(length):
+            r = reg + i
+            if r == FIFO_COUNTH:
+                out.append(len(self.fifo) >> 8)
+            elif r == FIFO_COUNTL:
+                out.append(len(self.fifo) & 0xFF)
+            elif r == INT_STATUS:
+                out.append(self.regs[r])
+                self.regs[r] = 0  # 読むとクリアされる
+            else:
+                out.append(self.regs[r & 0x7F])
+        return bytes(out)
+
+
+def tilt_signal(t):
+    angle = np.radians(10.0) * np.sin(2 * math.pi * 0.5 * t)
+    rate = np.degrees(np.radians(10.0) * 2 * math.pi * 0.5 * np.cos(2 * math.pi * 0.5 * t))
+    zero = np.zeros_like(t)
+    return (zero, 16384 * np.sin(angle), 16384 * np.cos(angle), rate * 131.0, zero, zero)
+
+
+class SimI2CBus:
+    """smbus2.SMBus と同じ使い方ができる仮想バス"""
+
+    i2c_msg = SimMessage
+
+    def __init__(self, devices=None, bus_hz=None):
+        self.devices = devices if devices is not None else {MPU6050_ADDR: SimMPU6050()}
+        self.bus_hz = bus_hz
+        self.transactions = 0
+        self.bytes_transferred = 0
+
+    def _device(self, addr):
+        if addr not in self.devices:
+            raise OSError(121, 'Remote I/O error')
+        return self.devices[addr]
+
+    def _transfer(self, nbytes):
+        """通信回数を数え、bus_hz が指定されていれば転送時間だけ待つ"""
+        self.transactions += 1
+        self.bytes_transferred += nbytes
+        if self.bus_hz:
+            # アドレス・レジスタ・再アドレス + データ、1バイト9ビット
+            time.sleep((nbytes + 3) * 9 / self.bus_hz)
+
+    def read_byte_data(self, addr, reg):
+        self._transfer(1)
+        return self._device(addr).read(reg, 1)[0]
+
+    def write_byte_data(self, addr, reg, value):
+        self._transfer(1)
+        self._device(addr).write(reg, value)
+
+    def read_i2c_block_data(self, addr, reg, length):
+        if length > 32:
+            raise ValueError('Desired block length over 32 bytes')
+        self._transfer(length)
+        return list(self._device(addr).read(reg, length))
+
+    def i2c_rdwr(self, *msgs):
+        """書き込み（レジスタ指定）→ 読み出しの組み合わせだけに対応"""
+        write, read = msgs
+        self._transfer(read.len)
+        read.buf = self._device(read.addr).read(write.write_data[0], read.len)
+
+    def close(self):
+        pass
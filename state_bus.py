@@ -0,0 +1,232 @@
+# 共有メモリの状態バス
+# モーター・PIRセンサー・LEDのプロセス間で、ピンの状態やイベントを共有する
+# ソケットもシリアライズも使わず、/dev/shm 上の構造体を直接読み書きする
+#
+# 仕組み:
+#   - 書き込む役割（PIR、モーター、LED）ごとにスロットを1つ持つ
+#   - 各スロットは書き込みプロセスが1つだけなので、ロックは不要（seqlock）
+#     書く前に seq を奇数にし、書き終わったら偶数に戻す
+#     読む側は seq が偶数かつ前後で同じなら、途中の値を読んでいないと分かる
+#   - 書き込みを待ちたいプロセスは <BUS_PATH>.wake/ に自分用の FIFO を作る
+#     書き込む側はそこにある FIFO すべてに1バイト書いて起こす（親子関係がなくてもよい）
+#     FIFO を作ったら SLOT_WAKE の番号を増やすので、書き込む側はそれが変わったときだけ一覧を読み直す
+#
+# 使い方:
+#   python3 state_bus.py          # バスの中身を表示し続ける
+#
+#   from state_bus import StateBus, SLOT_PIR
+#   bus = StateBus()
+#   bus.write(SLOT_PIR, pins={4: 1, 17: 1}, counter=1)
+#   print(bus.read(SLOT_PIR))
+#
+#   bus = StateBus(wakeup=True)   # 他のプロセスの書き込みを待つ
+#   while bus.wait():
+#       print(bus.read(SLOT_PIR))
+
+import contextlib
+import errno
+import mmap
+import os
+import select
+import struct
+import time
+from collections import namedtuple
+
+BUS_PATH = os.environ.get('STATE_BUS_PATH', '/dev/shm/rpi_state_bus')
+
+# スロット（書き込む役割ごと）
+SLOT_PIR = 0     # counter: 検知回数, value: 1=検知中
+SLOT_MOTOR = 1   # counter: コマンド数, value: gpio_client.MOTION_NAMES のインデックス
+SLOT_LED = 2     # value: 明るさ（0〜1000、fade.py --motion）
+SLOT_WAKE = 3    # 先頭4バイト: 待っているプロセスの登録番号（StateBus が使う）
+NUM_SLOTS = 4
+
+# スロットの構造（64バイトごとに配置して、キャッシュラインを共有しないようにする）
+SLOT_SIZE = 64
+SEQ = struct.Struct('<I')
+DATA = struct.Struct('<qQQQi')   # timestamp_ns, pin_mask, pin_levels, counter, value
+DATA_OFFSET = 8
+BUS_SIZE = SLOT_SIZE * NUM_SLOTS
+
+# seq がこれ以上奇数のままなら、書き込みプロセスが書き込みの途中で止まった（落ちた）とみなす
+READ_TIMEOUT = 0.01
+
+State = namedtuple('State', 'seq timestamp_ns pin_mask pin_levels counter value')
+
+
+class StaleSlotError(RuntimeError):
+    """書き込み途中のまま更新されないスロットを、まだ一度も読めていない"""
+
+
+class StateBus:
+    def __init__(self, path=BUS_PATH, wakeup=False):
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            if os.fstat(fd).st_size < BUS_SIZE:
+                os.ftruncate(fd, BUS_SIZE)
+            self.mem = mmap.mmap(fd, BUS_SIZE)
+        finally:
+            os.close(fd)
+        self.own = {}   # 自分が書き込むスロットの最新値
+        self.last = {}  # 最後に読めた値（書き込みプロセスが途中で落ちたときに返す）
+
+        self.wake_dir = path + '.wake'
+        os.makedirs(self.wake_dir, exist_ok=True)
+        self.waiters = {}  # 待っている他のプロセスの FIFO 名 → 書き込み用 fd
+        self.wake_gen = None
+        self.fifo = self.fifo_fd = None
+        if wakeup:
+            self.fifo = os.path.join(self.wake_dir, f'{os.getpid()}-{id(self):x}')
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self.fifo)
+            os.mkfifo(self.fifo, 0o666)
+            # 自分でも書き込み側として開いておけば、select が EOF で戻り続けることはない
+            self.fifo_fd = os.open(self.fifo, os.O_RDWR | os.O_NONBLOCK)
+            # 開いてから番号を増やす（同時に登録したプロセスと同じ値になっても、FIFO は先にできている）
+            SEQ.pack_into(self.mem, SLOT_WAKE * SLOT_SIZE,
+                          (SEQ.unpack_from(self.mem, SLOT_WAKE * SLOT_SIZE)[0] + 1) & 0xFFFFFFFF)
+
+    def write(self, slot, pins=None, counter=None, value=None):
+        """スロットを更新する（指定しなかった項目は前の値のまま）
+
+        pins は {ピン番号: 0/1} の辞書。1つのスロットに書くプロセスは1つだけにすること。
+        """
+        if slot not in self.own:
+            # 前の書き込みプロセスが途中で落ちていても（seq が奇数でも）続けられるようにする
+            base = slot * SLOT_SIZE
+            self.own[slot] = State(self.seq(slot) & ~1,
+                                   *DATA.unpack_from(self.mem, base + DATA_OFFSET))
+        prev = self.own[slot]
+        pin_mask, pin_levels = prev.pin_mask, prev.pin_levels
+        for pin, level in (pins or {}).items():
+            pin_mask |= 1 << pin
+            if level:
+                pin_levels |= 1 << pin
+            else:
+                pin_levels &= ~(1 << pin)
+
+        state = State((prev.seq + 2) & 0xFFFFFFFF, time.monotonic_ns(), pin_mask, pin_levels,
+                      prev.counter if counter is None else counter,
+                      prev.value if value is None else value)
+        base = slot * SLOT_SIZE
+        SEQ.pack_into(self.mem, base, (prev.seq + 1) & 0xFFFFFFFF)  # 奇数: 書き込み中
+        DATA.pack_into(self.mem, base + DATA_OFFSET, *state[1:])
+        SEQ.pack_into(self.mem, base, state.seq)
+        self.own[slot] = state
+        self.notify()
+
+    def notify(self):
+        """待っているプロセスの FIFO に1バイトずつ書いて起こす"""
+        gen, = SEQ.unpack_from(self.mem, SLOT_WAKE * SLOT_SIZE)
+        if gen != self.wake_gen:
+            self.wake_gen = gen
+            self.scan_waiters()
+        for name, fd in list(self.waiters.items()):
+            try:
+                os.write(fd, b'\0')
+            except BlockingIOError:
+                pass  # まだ読まれていない通知が残っている
+            except BrokenPipeError:
+                self.drop_waiter(name)  # 待っていたプロセスが終わった
+
+    def scan_waiters(self):
+        names = {name for name in os.listdir(self.wake_dir)
+                 if os.path.join(self.wake_dir, name) != self.fifo}
+        for name in set(self.waiters) - names:
+            os.close(self.waiters.pop(name))
+        for name in names - set(self.waiters):
+            try:
+                self.waiters[name] = os.open(os.path.join(self.wake_dir, name),
+                                             os.O_WRONLY | os.O_NONBLOCK)
+            except OSError as e:
+                if e.errno == errno.ENXIO:  # 読む側がいない = 落ちたプロセスの残り
+                    self.drop_waiter(name)
+                elif e.errno != errno.ENOENT:
+                    raise
+
+    def drop_waiter(self, name):
+        fd = self.waiters.pop(name, None)
+        if fd is not None:
+            os.close(fd)
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(os.path.join(self.wake_dir, name))
+
+    def read(self, slot):
+        """スロットの値を読む（書き込み途中なら読み直す）
+
+        READ_TIMEOUT 秒たっても書き込み途中のままなら、書き込みプロセスが途中で
+        落ちたとみなして最後に読めた値を返す（一度も読めていなければ StaleSlotError）。
+        """
+        base = slot * SLOT_SIZE
+        deadline = None
+        while True:
+            seq1, = SEQ.unpack_from(self.mem, base)
+            if not seq1 & 1:
+                data = DATA.unpack_from(self.mem, base + DATA_OFFSET)
+                seq2, = SEQ.unpack_from(self.mem, base)
+                if seq1 == seq2:
+                    state = self.last[slot] = State(seq1, *data)
+                    return state
+            if deadline is None:
+                deadline = time.monotonic() + READ_TIMEOUT
+            elif time.monotonic() > deadline:
+                if slot in self.last:
+                    return self.last[slot]
+                raise StaleSlotError(f'slot {slot} is stuck mid-write (seq={seq1})')
+
+    def seq(self, slot):
+        """更新されたかどうかの確認用（値は読まない）"""
+        return SEQ.unpack_from(self.mem, slot * SLOT_SIZE)[0]
+
+    def wait(self, timeout=None):
+        """他のプロセスの書き込みを待つ。通知があれば True（溜まっていた通知はまとめて捨てる）"""
+        if self.fifo_fd is None:
+            raise RuntimeError('StateBus was created without wakeup=True')
+        ready, _, _ = select.select([self.fifo_fd], [], [], timeout)
+        if ready:
+            with contextlib.suppress(BlockingIOError):
+                while os.read(self.fifo_fd, 4096):
+                    pass
+        return bool(ready)
+
+    def close(self):
+        self.mem.close()
+        for fd in self.waiters.values():
+            os.close(fd)
+        self.waiters.clear()
+        if self.fifo_fd is not None:
+            os.close(self.fifo_fd)
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self.fifo)
+            self.fifo_fd = None
+
+
+def pin_level(state, pin):
+    """State からピンの値を取り出す（報告されていないピンは None）"""
+    if not state.pin_mask >> pin & 1:
+        return None
+    return state.pin_levels >> pin & 1
+
+
+if __name__ == '__main__':
+    bus = StateBus(wakeup=True)
+    names = {SLOT_PIR: 'PIR', SLOT_MOTOR: 'MOTOR', SLOT_LED: 'LED'}
+    last = {slot: None for slot in names}
+    try:
+        print('State bus monitoring start!')
+        while True:
+            for slot, name in names.items():
+                seq = bus.seq(slot)
+                if seq != last[slot]:
+                    last[slot] = seq
+                    try:
+                        s = bus.read(slot)
+                    except StaleSlotError:
+                        print(f'{name}: writer stopped in the middle of a write')
+                        continue
+                    pins = {p: pin_level(s, p) for p in range(64) if s.pin_mask >> p & 1}
+                    print(f'{name}: pins={pins} counter={s.counter} value={s.value}')
+            bus.wait(1.0)  # 通知が来なくても、1秒ごとに seq を確かめる
+    except KeyboardInterrupt:
+        print('\nStopping...')
+        bus.close()